@@ -1,6 +1,18 @@
 import random
+import time
 from itertools import permutations
 import heapq
+import mmap
+import os
+import tempfile
+from multiprocessing import Pool
+from collections import deque
+from fractions import Fraction
+from math import gcd
+try:
+    import numpy as np
+except ImportError: # numpy is only needed for the batched helpers
+    np = None
 
 def generate_states(n, print_states=False):
     """
@@ -44,20 +56,147 @@ def oddneighborcheck(state):
         
             
 
-def get10States(states):
+### lazy state space: Lehmer code rank/unrank in the same order permutations() uses
+def rank_state(state):
     """
-    input: list of all states.
+    Input: 1d array representing a state
+    Output: index of the state in generate_states order (0 .. (n*n)!-1)
+    """
+    size = len(state)
+    rank = 0
+    used = 0
+    for i, val in enumerate(state):
+        # smaller values still to come = val minus smaller values already used
+        rank = rank*(size - i) + val - (used & ((1 << val) - 1)).bit_count()
+        used |= 1 << val
+    return rank
+
+def unrank_state(rank, n):
+    """
+    Input: rank from rank_state, n for nxn board
+    Output: the state as a list
+    """
+    size = n*n
+    digits = []
+    for base in range(1, size + 1):
+        rank, d = divmod(rank, base)
+        digits.append(d)
+    remaining = list(range(size))
+    return [remaining.pop(d) for d in reversed(digits)]
+
+def iter_states(n, goal=None, predicate=None):
+    """
+    Input: n for nxn board, optional goal to keep only states that can reach it,
+           optional predicate such as oddneighborcheck
+    Output: generator over the matching states, nothing is held in memory
+    """
+    for p in permutations(range(n*n)):
+        if goal is not None and not is_solvable(p, goal):
+            continue
+        if predicate is not None and not predicate(p):
+            continue
+        yield p
+
+def sample_states(n, k, goal=None, predicate=None, rng=random):
+    """
+    Input: n for nxn board, how many states, optional goal/predicate filters as in
+           iter_states, random source
+    Output: k distinct uniformly random states (tuples) passing the filters
+    draws random ranks, so it works for boards whose state list could never be built
+    """
+    total = 1
+    for i in range(2, n*n + 1):
+        total *= i
+    picked = set()
+    chosen = []
+    while len(chosen) < k and len(picked) < total:
+        rank = rng.randrange(total)
+        if rank in picked:
+            continue
+        picked.add(rank)
+        state = tuple(unrank_state(rank, n))
+        if goal is not None and not is_solvable(state, goal):
+            continue
+        if predicate is not None and not predicate(state):
+            continue
+        chosen.append(state)
+    return chosen
+
+def get10States(states=None, n=3):
+    """
+    input: list of all states, or None to sample nxn states by rank without building the list
     output: 10 randomly selected states must not have odd numbered neighbors
     SOLVES PART B
     """
+    if states is None:
+        return sample_states(n, 10, predicate=oddneighborcheck)
     chosen_10 = []
+    #remember picked indices instead of removing them from the list
+    picked = set()
     while len(chosen_10) != 10:
-        chosen_state = random.choice(states)
-        if oddneighborcheck(chosen_state):
-            chosen_10.append(chosen_state)
-            states.remove(chosen_state)
+        i = random.randrange(len(states))
+        if i in picked:
+            continue
+        picked.add(i)
+        if oddneighborcheck(states[i]):
+            chosen_10.append(states[i])
     return chosen_10
 
+### batched screening with numpy, one row per state
+NEIGHBOR_PAIRS = {}
+
+def neighbor_pairs(n):
+    """
+    Input: n for nxn board
+    Output: (a, b) index arrays, cells a[i] and b[i] touch (each pair listed once)
+    """
+    if n not in NEIGHBOR_PAIRS:
+        a = []
+        b = []
+        for i in range(n*n):
+            if (i+1) % n != 0: # right neighbor
+                a.append(i)
+                b.append(i+1)
+            if i+n < n*n: # neighbor below
+                a.append(i)
+                b.append(i+n)
+        NEIGHBOR_PAIRS[n] = (np.array(a), np.array(b))
+    return NEIGHBOR_PAIRS[n]
+
+def oddneighborcheck_batch(states):
+    """
+    Input: (N, n*n) integer array of states
+    Output: length N bool array, True where oddneighborcheck would be True
+    """
+    states = np.asarray(states)
+    n = int(states.shape[1]**.5)
+    odd = (states & 1).astype(bool)
+    bad = np.zeros(len(states), dtype=bool)
+    # one pair of columns at a time keeps memory at a few bytes per state
+    for i, j in zip(*neighbor_pairs(n)):
+        bad |= odd[:, i] & odd[:, j]
+    return ~bad
+
+def permutation_array(n):
+    """
+    Input: n for nxn board (3 or less, 4x4 has 16! rows)
+    Output: ((n*n)!, n*n) uint8 array of every state in generate_states order
+    """
+    size = n*n
+    total = 1
+    for i in range(2, size + 1):
+        total *= i
+    flat = np.fromiter((v for p in permutations(range(size)) for v in p), dtype=np.uint8, count=total*size)
+    return flat.reshape(total, size)
+
+def random_state_array(n, k, rng=None):
+    """
+    Input: n for nxn board, number of states, numpy Generator or seed
+    Output: (k, n*n) uint8 array of uniformly random states (rows may repeat)
+    """
+    rng = np.random.default_rng(rng)
+    return rng.permuted(np.tile(np.arange(n*n, dtype=np.uint8), (k, 1)), axis=1)
+
 def puzzle_move(state, action):
     """
     Input: 1d array representing a state and an action (up, down, left, right)
@@ -128,172 +267,1300 @@ def puzzle_move_2(state, action):
 
     return new_state
 
+### packed state engine
+### a board is one int with a fixed number of bits per cell (tile at cell i sits at bits i*bits)
+### plus the index of the blank, successors come from a per-blank move table
+MOVE_TABLES = {}
+
+def tile_bits(n):
+    """
+    Input: n for nxn board
+    Output: bits used per cell in a packed state (4 for boards up to 4x4)
+    """
+    return max(4, (n*n - 1).bit_length())
+
+def pack_state(state):
+    """
+    Input: 1d array representing a state
+    Output: (code, blank) packed int and index of the blank
+    """
+    bits = tile_bits(int(len(state)**.5))
+    code = 0
+    for i, val in enumerate(state):
+        code |= val << (bits*i)
+    return code, state.index(0)
+
+def unpack_state(code, n):
+    """
+    Input: packed int and n for nxn board
+    Output: 1d list representing the state
+    """
+    bits = tile_bits(n)
+    mask = (1 << bits) - 1
+    return [(code >> (bits*i)) & mask for i in range(n*n)]
+
+class MoveTable(list):
+    ### per-blank move lists plus the board width and the tile mask the shifts go with
+    def __init__(self, n, moves):
+        super().__init__(moves)
+        self.n = n
+        self.mask = (1 << tile_bits(n)) - 1
+
+def get_move_table(n):
+    """
+    Input: n for nxn board
+    Output: MoveTable indexed by blank position, each entry a tuple of
+            (action, new_blank, shift_new, shift_blank) for every legal move
+    same actions as puzzle_move_2 (1 up, 2 down, 3 left, 4 right), built once per n
+    """
+    if n in MOVE_TABLES:
+        return MOVE_TABLES[n]
+    bits = tile_bits(n)
+    table = []
+    for idx in range(n*n):
+        moves = []
+        if idx-n >= 0:
+            moves.append((1, idx-n))
+        if idx+n < n*n:
+            moves.append((2, idx+n))
+        if idx%n != 0:
+            moves.append((3, idx-1))
+        if (idx+1)%n != 0:
+            moves.append((4, idx+1))
+        table.append(tuple((action, nb, bits*nb, bits*idx) for action, nb in moves))
+    MOVE_TABLES[n] = MoveTable(n, table)
+    return MOVE_TABLES[n]
+
+def packed_neighbors(code, blank, table):
+    """
+    Input: packed state, blank index, move table from get_move_table
+    Output: yields (action, next_code, next_blank) for each legal move
+    the solvers inline this loop with table.mask hoisted, it is for code off the hot path
+    """
+    mask = table.mask
+    for action, nb, shift_new, shift_blank in table[blank]:
+        # slide the tile at nb into the blank, nb becomes the new blank
+        tile = (code >> shift_new) & mask
+        yield action, code - (tile << shift_new) + (tile << shift_blank), nb
+
+def bfs_solve_packed(start_state, goal=[0,1,2,3,4,5,6,7,8]):
+    """
+    Input: start state, goal state
+    Output: same (state, actions, state_seq) as bfs_solve
+    BFS over packed states, each expansion is a few bit operations
+    """
+    n = int(len(start_state)**.5)
+    table = get_move_table(n)
+    mask = table.mask
+    start_code, start_blank = pack_state(start_state)
+    goal_code, _ = pack_state(goal)
+    # packed state -> (parent code, parent blank, action)
+    parents = {start_code: None}
+    queue = deque([(start_code, start_blank)])
+    while queue:
+        code, blank = queue.popleft()
+        if code == goal_code:
+            # walk parents back to the start
+            actions = []
+            codes = [code]
+            while parents[code] is not None:
+                code, blank, action = parents[code]
+                actions.append(action)
+                codes.append(code)
+            actions.reverse()
+            codes.reverse()
+            return list(goal), actions, [unpack_state(c, n) for c in codes]
+        for action, nb, shift_new, shift_blank in table[blank]:
+            tile = (code >> shift_new) & mask
+            next_code = code - (tile << shift_new) + (tile << shift_blank)
+            if next_code not in parents:
+                parents[next_code] = (code, blank, action)
+                queue.append((next_code, nb))
+    return None
+
+def rows_divisible_by(k):
+    """
+    Input: divisor k
+    Output: predicate, True when every row of an nxn state read as a decimal number
+            (100*a + 10*b + c for a 3x3 row) is divisible by k
+    """
+    def predicate(state):
+        n = int(len(state)**.5)
+        for i in range(n):
+            total = 0
+            for j in range(n):
+                total = total*10 + state[i*n + j]
+            if total % k != 0:
+                return False
+        return True
+    return predicate
+
+def goal_search(start_state, goal_test, move=puzzle_move, max_nodes=1000000):
+    """
+    Input: start state, predicate on states, move function move(state, action) for
+           actions 1-4 (default puzzle_move, which only slides odd tiles), most states
+           to store before giving up
+    Output: (state, steps, path) for the fewest moves to a state passing goal_test,
+            path holds every state from the start, None if no reachable state passes
+    raises RuntimeError when max_nodes states are stored before the search finishes
+    """
+    queue = deque([start_state])
+    # state tuple -> parent state tuple, the parent is stored so any move function works
+    parents = {tuple(start_state): None}
+    while queue:
+        state = queue.popleft()
+        if goal_test(state):
+            path = [state]
+            parent = parents[tuple(state)]
+            while parent is not None:
+                path.append(list(parent))
+                parent = parents[parent]
+            path.reverse()
+            return state, len(path) - 1, path
+        key = tuple(state)
+        for action in [1,2,3,4]:
+            next_state = move(state, action)
+            if tuple(next_state) not in parents:
+                if len(parents) >= max_nodes:
+                    raise RuntimeError("goal_search stored {} states without finishing".format(max_nodes))
+                parents[tuple(next_state)] = key
+                queue.append(next_state)
+    return None
+
 def rand_div_3(state):
     """
     Input: 1d array representing nxn grid
+    Output: (final state, steps, path) with the fewest puzzle_move steps until every row
+            is divisible by 3, None if no reachable state qualifies
+    raises RuntimeError if the search hits goal_search's max_nodes first
     SOLVES part D
     """
-    # calculate size of grid
-    n = int(len(state)**.5)
-    #initialize solved bool, step count, path
-    solved = False
-    steps = 0
-    path = [state]
-    while not solved:
-        solved = True
-        # for each row of grid
-        for i in range(n):
-            #check if a row is divisible by 3
-            total = (100*state[i*n]) + (10*state[(i*n) + 1]) + (1*state[(i*n) + 2]) 
-            if total % 3 != 0:
-                #update vars and break if a row is not divisible by 3
-                solved = False
-                state = puzzle_move(state, random.randint(1, 4))
-                steps += 1
-                path.append(state)
-                break
-    return state, steps, path
+    return goal_search(state, rows_divisible_by(3))
+
+INVERSE_ACTION = {1: 2, 2: 1, 3: 4, 4: 3}
+
+def rebuild_path(came_from, state):
+    """
+    Input: map of state tuple -> action that reached it (0 for the start), reached state
+    Output: (actions, state_seq) from the start to state
+    each state only remembers one action, the parent is found by undoing it
+    """
+    actions = []
+    state_seq = [state]
+    action = came_from[tuple(state)]
+    while action != 0:
+        actions.append(action)
+        state = puzzle_move_2(state, INVERSE_ACTION[action])
+        state_seq.append(state)
+        action = came_from[tuple(state)]
+    actions.reverse()
+    state_seq.reverse()
+    return actions, state_seq
+
+### search instrumentation
+class SearchStats:
+    ### pass as stats= to a solver, it is filled in when the solver returns
+    def __init__(self):
+        self.nodes_generated = 0
+        self.nodes_expanded = 0
+        self.peak_frontier = 0
+        self.peak_visited = 0
+        self.elapsed = 0.0
+        self._start = None
+
+    def start(self):
+        self._start = time.perf_counter()
+
+    def stop(self, generated, expanded, peak_frontier, peak_visited):
+        self.elapsed = time.perf_counter() - self._start
+        self.nodes_generated = generated
+        self.nodes_expanded = expanded
+        self.peak_frontier = peak_frontier
+        self.peak_visited = peak_visited
+
+    @property
+    def nodes_per_sec(self):
+        return self.nodes_expanded/self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'nodes_generated': self.nodes_generated,
+            'nodes_expanded': self.nodes_expanded,
+            'peak_frontier': self.peak_frontier,
+            'peak_visited': self.peak_visited,
+            'elapsed': self.elapsed,
+            'nodes_per_sec': self.nodes_per_sec,
+        }
+
+### visited / came-from structures, all map a state to the action that first reached it
+RANK_TABLE_LIMIT = 1 << 26 # largest RankTable (bytes) make_came_from will pick on 'auto'
+
+def rank_index(state, half):
+    """
+    Input: state, (size-1)!/2 for the board size
+    Output: index of the state in a table covering one connected half of the state space
+    """
+    tiles = [t-1 for t in state if t != 0]
+    return state.index(0)*half + (rank_state(tiles) >> 1)
+
+class RankTable:
+    ### one byte per state of a connected half of the nxn state space (9!/2 = 181440
+    ### bytes for 3x3), indexed by the blank cell and the Lehmer rank of the other tiles.
+    ### for a fixed blank cell only one parity of the tiles is reachable, and ranks 2m and
+    ### 2m+1 differ by a swap of the last two tiles, so the rank is halved
+    def __init__(self, n):
+        size = n*n
+        self.half = 1
+        for i in range(2, size):
+            self.half *= i
+        self.half //= 2
+        self.actions = bytearray(size*self.half) # 0 = not visited, else action + 1
+        self.count = 0
+
+    def index(self, state):
+        return rank_index(state, self.half)
+
+    def __contains__(self, state):
+        return self.actions[self.index(state)] != 0
+
+    def __getitem__(self, state):
+        action = self.actions[self.index(state)]
+        if action == 0:
+            raise KeyError(tuple(state))
+        return action - 1
 
-def bfs_solve(start_state):
+    def __setitem__(self, state, action):
+        i = self.index(state)
+        if self.actions[i] == 0:
+            self.count += 1
+        self.actions[i] = action + 1
+
+    def __len__(self):
+        return self.count
+
+class PackedTable:
+    ### hash map keyed by the packed int of a state instead of a tuple, for boards whose
+    ### state space is too large to index by rank
+    def __init__(self):
+        self.actions = {}
+
+    def __contains__(self, state):
+        return pack_state(state)[0] in self.actions
+
+    def __getitem__(self, state):
+        return self.actions[pack_state(state)[0]]
+
+    def __setitem__(self, state, action):
+        self.actions[pack_state(state)[0]] = action
+
+    def __len__(self):
+        return len(self.actions)
+
+def make_came_from(n, visited='set'):
     """
-    Input: start state
+    Input: n for nxn board, visited structure: 'set' (dict of tuples), 'rank'
+           (RankTable, a byte per state), 'packed' (PackedTable) or 'auto' (RankTable
+           when it fits)
+    Output: empty came-from map for the solvers
+    """
+    if visited == 'auto':
+        table_bytes = 1
+        for i in range(2, n*n + 1):
+            table_bytes *= i
+        visited = 'rank' if table_bytes//2 <= RANK_TABLE_LIMIT else 'packed'
+    if visited == 'set':
+        return {}
+    if visited == 'rank':
+        return RankTable(n)
+    if visited == 'packed':
+        return PackedTable()
+    raise ValueError("unknown visited structure {}".format(visited))
+
+def bfs_solve(start_state, goal=[0,1,2,3,4,5,6,7,8], visited='set', stats=None):
+    """
+    Input: start state, goal, visited structure (see make_came_from), optional SearchStats
     SOLVE PART E
     """
-    #add start to queue and visited
-    queue = [(start_state, [], [start_state])]
-    visited = {tuple(start_state)}
+    #add start to queue and visited, came_from doubles as the visited set
+    queue = deque([start_state])
+    came_from = make_came_from(int(len(start_state)**.5), visited)
+    came_from[tuple(start_state)] = 0
+    generated = expanded = peak_frontier = 0
+    if stats is not None:
+        stats.start()
 
     #while queue isn't empty
     while queue:
+        if len(queue) > peak_frontier:
+            peak_frontier = len(queue)
         #deque state
-        state, actions, state_seq = queue.pop(0)
+        state = queue.popleft()
         #if state is goal return state and path
-        if state == [0,1,2,3,4,5,6,7,8]:
+        if state == goal:
+            if stats is not None:
+                stats.stop(generated, expanded, peak_frontier, len(came_from))
+            actions, state_seq = rebuild_path(came_from, state)
             return state, actions, state_seq
+        expanded += 1
         #check each possible path 
         for action in [1,2,3,4]:
             next_state = puzzle_move_2(state, action)
+            if next_state is state:
+                continue
+            generated += 1
             #if next state isnt visited
-            if tuple(next_state) not in visited:
+            if tuple(next_state) not in came_from:
                 #mark next state as visited and add to queue
-                visited.add(tuple(next_state))
-                queue.append((next_state, actions + [action], state_seq + [next_state]))
+                came_from[tuple(next_state)] = action
+                queue.append(next_state)
+    if stats is not None:
+        stats.stop(generated, expanded, peak_frontier, len(came_from))
     return None
 
 
-def dfs_solve(start_state):
+def dfs_solve(start_state, visited='set', stats=None):
 
     """
-    I couldn't print the list of states becuase it crashed my computer
+    Only the action into each state is stored, the path is rebuilt once at the goal
     THe output list of actions is too long so I couldnt print it
-    Input: start_State: list
+    Input: start_State: list, visited structure (see make_came_from), optional SearchStats
     SOLVE PART F
     """
-    #initialize stack and visited set
-    stack = [(start_state, [])]  
-    visited = set()
+    #initialize stack of (state, action that generated it) and visited map
+    stack = [(start_state, 0)]
+    came_from = make_came_from(int(len(start_state)**.5), visited)
+    generated = expanded = peak_frontier = 0
+    if stats is not None:
+        stats.start()
     # while stack isn't empty
     while stack:
+        if len(stack) > peak_frontier:
+            peak_frontier = len(stack)
         #pop state
-        state, actions = stack.pop()
+        state, action = stack.pop()
         #if its been visited go to next iteration
-        if tuple(state) in visited:
+        if tuple(state) in came_from:
             continue
         #add state to visited
-        visited.add(tuple(state))
+        came_from[tuple(state)] = action
         #if its the goal return
         if state == [0,1,2,3,4,5,6,7,8]:
+            if stats is not None:
+                stats.stop(generated, expanded, peak_frontier, len(came_from))
+            actions, state_seq = rebuild_path(came_from, state)
             return state, actions
+        expanded += 1
         #check child states
         for action in [1, 2, 3, 4]:
             next_state = puzzle_move_2(state, action)
-            if next_state != state:
-                stack.append((next_state, actions + [action]))
+            if next_state is state:
+                continue
+            generated += 1
+            if tuple(next_state) not in came_from:
+                stack.append((next_state, action))
 
+    if stats is not None:
+        stats.stop(generated, expanded, peak_frontier, len(came_from))
     return None
 
-def partG(start_state):
+def partG(start_state, visited='set', stats=None):
     """
-    Input: start state
+    Input: start state, visited structure (see make_came_from), optional SearchStats
     SOLVE PART G
     """
-    #add start to queue and visited
-    queue = [(start_state, [], [start_state])]
-    visited = {tuple(start_state)}
+    return bfs_solve(start_state, goal=[1,2,3,8,0,4,7,6,5], visited=visited, stats=stats)
 
-    #while queue isn't empty
-    while queue:
-        #deque state
-        state, actions, state_seq = queue.pop(0)
-        #if state is goal return state and path
-        if state == [1,2,3,8,0,4,7,6,5]:
-            return state, actions, state_seq
-        #check each possible path 
-        for action in [1,2,3,4]:
-            next_state = puzzle_move_2(state, action)
-            #if next state isnt visited
-            if tuple(next_state) not in visited:
-                #mark next state as visited and add to queue
-                visited.add(tuple(next_state))
-                queue.append((next_state, actions + [action], state_seq + [next_state]))
-    return None
+def bidirectional_bfs_solve(start_state, goal=[0,1,2,3,4,5,6,7,8]):
+    """
+    Input: start state, goal state
+    Output: same (state, actions, state_seq) as bfs_solve
+    grows whole BFS layers from the start and the goal (smaller frontier first) until they
+    meet, then walks from the start taking the lowest numbered action that stays on a
+    shortest path, which is the path bfs_solve finds
+    """
+    n = int(len(start_state)**.5)
+    table = get_move_table(n)
+    mask = table.mask
+    start_code, start_blank = pack_state(start_state)
+    goal_code, goal_blank = pack_state(goal)
+    if start_code == goal_code:
+        return start_state, [], [start_state]
+
+    def blank_of(code):
+        return unpack_state(code, n).index(0)
 
+    def neighbors(code, blank):
+        return packed_neighbors(code, blank, table)
 
-def ucs_solve(start_state):
-    #prio queue and set
+    # packed state -> depth from the start / from the goal
+    fwd = {start_code: 0}
+    bwd = {goal_code: 0}
+    fwd_front = [(start_code, start_blank)]
+    bwd_front = [(goal_code, goal_blank)]
+    fwd_depth = bwd_depth = 0
+    dist = None
+    while fwd_front and bwd_front and dist is None:
+        forward = len(fwd_front) <= len(bwd_front)
+        front, seen, other = (fwd_front, fwd, bwd) if forward else (bwd_front, bwd, fwd)
+        depth = fwd_depth if forward else bwd_depth
+        next_front = []
+        for code, blank in front:
+            for _, nb, shift_new, shift_blank in table[blank]:
+                tile = (code >> shift_new) & mask
+                nxt = code - (tile << shift_new) + (tile << shift_blank)
+                if nxt not in seen:
+                    seen[nxt] = depth + 1
+                    next_front.append((nxt, nb))
+                    if nxt in other and (dist is None or depth + 1 + other[nxt] < dist):
+                        dist = depth + 1 + other[nxt]
+        if forward:
+            fwd_front, fwd_depth = next_front, depth + 1
+        else:
+            bwd_front, bwd_depth = next_front, depth + 1
+    if dist is None:
+        return None
+
+    # every shortest path crosses layer k with both depths known there
+    k = max(0, dist - bwd_depth)
+    on_path = [None]*(k + 1)
+    on_path[k] = {code for code, d in fwd.items() if d == k and bwd.get(code) == dist - k}
+    for i in range(k - 1, -1, -1):
+        on_path[i] = set()
+        for code in on_path[i + 1]:
+            for _, prev, _ in neighbors(code, blank_of(code)):
+                if fwd.get(prev) == i:
+                    on_path[i].add(prev)
+
+    actions = []
+    codes = [start_code]
+    code, blank = start_code, start_blank
+    for i in range(dist):
+        for action, nxt, nb in neighbors(code, blank):
+            if (nxt in on_path[i + 1]) if i + 1 <= k else (bwd.get(nxt) == dist - i - 1):
+                break
+        actions.append(action)
+        codes.append(nxt)
+        code, blank = nxt, nb
+    return list(goal), actions, [unpack_state(c, n) for c in codes]
+
+
+def _path_before(a, b):
+    """
+    Input: two paths coded as a 1 bit followed by 2 bits (action - 1) per move
+    Output: True if path a comes first in lexicographic order (a prefix comes first)
+    """
+    la, lb = a.bit_length(), b.bit_length()
+    if la < lb:
+        return a << (lb - la) <= b
+    return a < b << (la - lb)
+
+def _ucs(start_state, costs, visited, stats):
+    """
+    Input: start state, cost of each action, visited structure (see make_came_from),
+           optional SearchStats
+    Output: (cost, state, path, state_seq) to 0..8, None if it cannot be reached
+    equal-cost ties go to the lexicographically smallest action sequence, the order the
+    original heap of (cost, state, path, state_seq) entries gave
+    """
+    #prio queue of (cost, state tuple), frontier holds the best (cost, action, path code
+    #as in _path_before) into each queued state and came_from doubles as the visited map
     prio_queue = []
-    visited = set()
+    frontier = {tuple(start_state): (0, 0, 1)}
+    came_from = make_came_from(int(len(start_state)**.5), visited)
+    generated = expanded = peak_frontier = 0
+    if stats is not None:
+        stats.start()
     #push info to prio queue
-    heapq.heappush(prio_queue, (0,start_state, [], []))
+    heapq.heappush(prio_queue, (0, tuple(start_state)))
     #while not empty
     while prio_queue:
+        if len(prio_queue) > peak_frontier:
+            peak_frontier = len(prio_queue)
         #pop values from prio queue
-        cost, state, path, state_seq  = heapq.heappop(prio_queue)
-        #go to next iteration if visited
-        if tuple(state) in visited:
+        cost, key = heapq.heappop(prio_queue)
+        #go to next iteration if visited or a cheaper entry was queued
+        if key in came_from or frontier[key][0] != cost:
             continue
-        visited.add(tuple(state))
+        _, came_from[key], code = frontier.pop(key)
+        state = list(key)
         #if goal rturn
         if state == [0,1,2,3,4,5,6,7,8]:
-            return cost, state, path, state_seq
+            if stats is not None:
+                stats.stop(generated, expanded, peak_frontier, len(came_from))
+            path, state_seq = rebuild_path(came_from, state)
+            return cost, state, path, [tuple(s) for s in state_seq[1:]]
+        expanded += 1
         # check child nodes
         for action in [1,2,3,4]:
             next_state = puzzle_move_2(state, action)
-            if next_state != state:
-                heapq.heappush(prio_queue, ( cost+1, next_state, path + [action], state_seq + [tuple(next_state)]))
+            if next_state is state:
+                continue
+            generated += 1
+            next_key = tuple(next_state)
+            if next_key in came_from:
+                continue
+            next_cost = cost + costs[action]
+            next_code = code << 2 | (action - 1)
+            queued = frontier.get(next_key)
+            if queued is None or next_cost < queued[0]:
+                frontier[next_key] = (next_cost, action, next_code)
+                heapq.heappush(prio_queue, (next_cost, next_key))
+            elif next_cost == queued[0] and _path_before(next_code, queued[2]):
+                # same cost through another parent, the smaller path wins
+                frontier[next_key] = (next_cost, action, next_code)
+    if stats is not None:
+        stats.stop(generated, expanded, peak_frontier, len(came_from))
     return None
 
-def ucs_solve_2(start_state):
-    #prio queue and set
-    prio_queue = []
-    visited = set()
-    #push info to prio queue
-    heapq.heappush(prio_queue, (0,start_state, [], []))
-    #while not empty
+def ucs_solve(start_state, visited='set', stats=None):
+    """
+    Input: start state, visited structure (see make_came_from), optional SearchStats
+    Output: (cost, state, path, state_seq) with every move costing 1, equal-cost ties go
+            to the lexicographically smallest action sequence
+    SOLVE PART H-A
+    """
+    return _ucs(start_state, UCS_COSTS, visited, stats)
+
+#cost of each action in part H-A and part H-B
+UCS_COSTS = {1: 1, 2: 1, 3: 1, 4: 1}
+UCS_2_COSTS = {1: 1.5, 2: .5, 3: 1, 4: 2}
+
+def ucs_solve_2(start_state, visited='set', costs=UCS_2_COSTS, stats=None):
+    """
+    Input: start state, visited structure (see make_came_from), cost of each action,
+           optional SearchStats
+    Output: (cost, state, path, state_seq), equal-cost ties go to the lexicographically
+            smallest action sequence
+    SOLVE PART H-B
+    """
+    return _ucs(start_state, costs, visited, stats)
+
+def ucs_dial_solve(start_state, costs=UCS_2_COSTS, goal=[0,1,2,3,4,5,6,7,8], visited='set',
+                   stats=None):
+    """
+    Input: start state, cost of each action (non-negative, any mix of fractions such as
+           multiples of .5), goal, visited structure (see make_came_from), optional SearchStats
+    Output: same (cost, state, path, state_seq) as ucs_solve_2 when every cost is positive,
+            equal-cost ties go to the lexicographically smallest action sequence
+    Dial's algorithm: costs are scaled to integers and the frontier is a ring of
+    max_cost+1 buckets, a child is only queued when it beats the best known cost and
+    outdated entries are skipped when their bucket comes up
+    """
+    # smallest scale that makes every cost an integer
+    scale = 1
+    for c in costs.values():
+        if c < 0:
+            raise ValueError("Dial's algorithm needs non-negative costs")
+        denom = Fraction(c).limit_denominator(1000).denominator
+        scale = scale*denom//gcd(scale, denom)
+    int_costs = {action: round(c*scale) for action, c in costs.items()}
+    width = max(int_costs.values()) + 1
+    buckets = [[] for _ in range(width)]
+
+    came_from = make_came_from(int(len(start_state)**.5), visited)
+    # best (cost, action, path code as in _path_before) queued for each unsettled state
+    best = {tuple(start_state): (0, 0, 1)}
+    buckets[0].append(tuple(start_state))
+    pending = 1
+    cost = 0
+    generated = expanded = peak_frontier = 0
+    if stats is not None:
+        stats.start()
+    while pending:
+        if pending > peak_frontier:
+            peak_frontier = pending
+        bucket = buckets[cost % width]
+        while bucket:
+            key = bucket.pop()
+            pending -= 1
+            # already settled or a cheaper entry for this state was queued
+            if key in came_from or best[key][0] != cost:
+                continue
+            _, came_from[key], code = best.pop(key)
+            state = list(key)
+            if state == goal:
+                if stats is not None:
+                    stats.stop(generated, expanded, peak_frontier, len(came_from))
+                path, state_seq = rebuild_path(came_from, state)
+                return cost/scale, state, path, [tuple(s) for s in state_seq[1:]]
+            expanded += 1
+            for action in [1,2,3,4]:
+                next_state = puzzle_move_2(state, action)
+                if next_state is state:
+                    continue
+                generated += 1
+                next_key = tuple(next_state)
+                if next_key in came_from:
+                    continue
+                next_cost = cost + int_costs[action]
+                next_code = code << 2 | (action - 1)
+                queued = best.get(next_key)
+                if queued is None or next_cost < queued[0]:
+                    best[next_key] = (next_cost, action, next_code)
+                    buckets[next_cost % width].append(next_key)
+                    pending += 1
+                elif next_cost == queued[0] and _path_before(next_code, queued[2]):
+                    # same cost through another parent, the smaller path wins
+                    best[next_key] = (next_cost, action, next_code)
+        cost += 1
+    if stats is not None:
+        stats.stop(generated, expanded, peak_frontier, len(came_from))
+    return None
+
+
+### all-states distance table and batch solving
+DIST_MAGIC = b'DST1'
+
+def build_distance_table(goal=[0,1,2,3,4,5,6,7,8]):
+    """
+    Input: goal state
+    Output: bytearray with the optimal number of moves to goal for every state that can
+            reach it, indexed by rank_index (255 = cannot reach goal)
+    one BFS back from the goal over packed states
+    """
+    n = int(len(goal)**.5)
+    size = n*n
+    half = 1
+    for i in range(2, size):
+        half *= i
+    half //= 2
+    table = get_move_table(n)
+    mask = table.mask
+    dist = bytearray(b'\xff')*(size*half)
+    goal_code, goal_blank = pack_state(goal)
+    dist[rank_index(goal, half)] = 0
+    seen = {goal_code}
+    layer = [(goal_code, goal_blank)]
+    depth = 0
+    while layer:
+        depth += 1
+        next_layer = []
+        for code, blank in layer:
+            for _, nb, shift_new, shift_blank in table[blank]:
+                tile = (code >> shift_new) & mask
+                nxt = code - (tile << shift_new) + (tile << shift_blank)
+                if nxt not in seen:
+                    seen.add(nxt)
+                    dist[rank_index(unpack_state(nxt, n), half)] = depth
+                    next_layer.append((nxt, nb))
+        layer = next_layer
+    return dist
+
+def save_distance_table(path, goal, dist):
+    """
+    Input: output path, goal state, table from build_distance_table
+    the table is written to a temporary file in the same directory and renamed over path,
+    so a process opening path never sees a half-written table
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(DIST_MAGIC + bytes([len(goal)]) + bytes(goal))
+            f.write(dist)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+class DistanceTable:
+    ### a saved distance table opened with mmap, shared between processes
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:4] != DIST_MAGIC:
+            raise ValueError("{} is not a distance table".format(path))
+        size = self.mm[4]
+        self.goal = list(self.mm[5:5 + size])
+        self.offset = 5 + size
+        self.half = 1
+        for i in range(2, size):
+            self.half *= i
+        self.half //= 2
+
+    def distance(self, state):
+        """
+        Input: state
+        Output: optimal number of moves to the goal, None if the goal cannot be reached
+        """
+        d = self.mm[self.offset + rank_index(state, self.half)]
+        return None if d == 255 or not is_solvable(state, self.goal) else d
+
+    def solve(self, state):
+        """
+        Input: state
+        Output: bfs_solve's action list (the lowest numbered action that moves one step
+                closer at each step), None if the goal cannot be reached
+        """
+        d = self.distance(state)
+        if d is None:
+            return None
+        n = int(len(state)**.5)
+        table = get_move_table(n)
+        state = list(state)
+        blank = state.index(0)
+        actions = []
+        while d > 0:
+            for action, nb, _, _ in table[blank]:
+                state[blank], state[nb] = state[nb], 0
+                if self.mm[self.offset + rank_index(state, self.half)] == d - 1:
+                    break
+                state[nb], state[blank] = state[blank], 0
+            actions.append(action)
+            blank = nb
+            d -= 1
+        return actions
+
+def distance_table_path(goal=[0,1,2,3,4,5,6,7,8]):
+    """
+    Input: goal state
+    Output: default file for the goal's distance table, next to this module
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "distance_{}.dist".format("-".join(map(str, goal))))
+
+def load_distance_table(path=None, goal=[0,1,2,3,4,5,6,7,8]):
+    """
+    Input: table path (defaults to distance_table_path(goal)), goal the table is for
+    Output: DistanceTable, the file is built and saved on first use
+    raises ValueError if the file at path was built for another goal
+    """
+    if path is None:
+        path = distance_table_path(goal)
+    if not os.path.exists(path):
+        save_distance_table(path, goal, build_distance_table(goal))
+    table = DistanceTable(path)
+    if table.goal != list(goal):
+        raise ValueError("{} was built for goal {}, not {}".format(path, table.goal, list(goal)))
+    return table
+
+_worker_table = None
+
+def _init_batch_worker(path):
+    global _worker_table
+    _worker_table = DistanceTable(path)
+
+def _batch_worker(state):
+    return _worker_table.solve(state)
+
+def batch_solve(starts, table=None, processes=None, chunksize=1000, goal=None):
+    """
+    Input: list of start states, DistanceTable or path to one (defaults to
+           distance_table_path(goal), built there if missing), number of worker processes
+           (None = solve in this process), starts per worker task, goal state (defaults
+           to 0..8, or to the goal a given DistanceTable was built for)
+    Output: list with bfs_solve's action list for every start (None if unsolvable)
+    """
+    if not isinstance(table, DistanceTable):
+        table = load_distance_table(table, [0,1,2,3,4,5,6,7,8] if goal is None else goal)
+    elif goal is not None and list(goal) != table.goal:
+        raise ValueError("{} was built for goal {}, not {}".format(table.path, table.goal, list(goal)))
+    if processes is None or processes <= 1:
+        return [table.solve(state) for state in starts]
+    # workers map the same file, so the table is shared rather than copied
+    with Pool(processes, initializer=_init_batch_worker, initargs=(table.path,)) as pool:
+        return pool.map(_batch_worker, starts, chunksize)
+
+
+### informed search for any nxn board
+def goal_positions(goal):
+    """
+    Input: goal state
+    Output: list where entry t is the index tile t has in the goal
+    """
+    pos = [0]*len(goal)
+    for i, tile in enumerate(goal):
+        pos[tile] = i
+    return pos
+
+def is_solvable(state, goal):
+    """
+    Input: state and goal of the same nxn board
+    Output: True if goal can be reached with puzzle_move_2 moves
+    every move swaps the blank with a neighbor, so it flips the permutation parity and
+    the blank's taxicab distance to its goal cell at the same time
+    """
+    n = int(len(state)**.5)
+    pos = goal_positions(goal)
+    perm = [pos[tile] for tile in state]
+    seen = [False]*len(perm)
+    swaps = 0
+    # a cycle of length L takes L-1 swaps
+    for i in range(len(perm)):
+        if seen[i]:
+            continue
+        j = i
+        while not seen[j]:
+            seen[j] = True
+            j = perm[j]
+            swaps += 1
+        swaps -= 1
+    blank, blank_goal = state.index(0), pos[0]
+    dist = abs(blank//n - blank_goal//n) + abs(blank%n - blank_goal%n)
+    return swaps % 2 == dist % 2
+
+def manhattan(state, goal_pos, n):
+    """
+    Input: state, goal_positions of the goal, board width
+    Output: sum of distances of every tile from its goal cell
+    """
+    total = 0
+    for i, tile in enumerate(state):
+        if tile != 0:
+            g = goal_pos[tile]
+            total += abs(i//n - g//n) + abs(i%n - g%n)
+    return total
+
+def _line_removals(line):
+    """
+    Input: goal offsets of the tiles in one row/column that belong to that row/column
+    Output: fewest tiles that must leave the line so the rest are in order (len - LIS)
+    """
+    tails = []
+    for x in line:
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo+hi)//2
+            if tails[mid] < x:
+                lo = mid+1
+            else:
+                hi = mid
+        if lo == len(tails):
+            tails.append(x)
+        else:
+            tails[lo] = x
+    return len(line) - len(tails)
+
+def linear_conflict(state, goal_pos, n):
+    """
+    Input: state, goal_positions of the goal, board width
+    Output: manhattan distance plus 2 moves for every tile that has to step out of
+            its goal row or column to let another tile in the same line pass
+    """
+    total = manhattan(state, goal_pos, n)
+    for r in range(n):
+        row = []
+        col = []
+        for c in range(n):
+            tile = state[r*n + c]
+            if tile != 0 and goal_pos[tile]//n == r:
+                row.append(goal_pos[tile] % n)
+            tile = state[c*n + r]
+            if tile != 0 and goal_pos[tile] % n == r:
+                col.append(goal_pos[tile]//n)
+        total += 2*(_line_removals(row) + _line_removals(col))
+    return total
+
+WD_TABLES = {}
+
+def walking_distance_table(n, blank_line):
+    """
+    Input: board width, row the blank sits in at the goal
+    Output: dict of (tile counts per row and goal row, blank row) -> vertical moves
+    built once by BFS back from the goal, the same table serves columns by symmetry
+    """
+    if (n, blank_line) in WD_TABLES:
+        return WD_TABLES[(n, blank_line)]
+    counts = [0]*(n*n)
+    for r in range(n):
+        counts[r*n + r] = n - 1 if r == blank_line else n
+    start = tuple(counts) + (blank_line,)
+    table = {start: 0}
+    queue = deque([start])
+    while queue:
+        key = queue.popleft()
+        dist = table[key]
+        blank = key[-1]
+        for other in (blank-1, blank+1):
+            if not 0 <= other < n:
+                continue
+            # a tile from the other row slides into the blank's row
+            for g in range(n):
+                if key[other*n + g] == 0:
+                    continue
+                nxt = list(key)
+                nxt[other*n + g] -= 1
+                nxt[blank*n + g] += 1
+                nxt[-1] = other
+                nxt = tuple(nxt)
+                if nxt not in table:
+                    table[nxt] = dist + 1
+                    queue.append(nxt)
+    WD_TABLES[(n, blank_line)] = table
+    return table
+
+def walking_distance(state, goal_pos, n):
+    """
+    Input: state, goal_positions of the goal, board width
+    Output: vertical plus horizontal walking distance
+    """
+    rows = [0]*(n*n)
+    cols = [0]*(n*n)
+    for i, tile in enumerate(state):
+        if tile == 0:
+            blank = i
+            continue
+        g = goal_pos[tile]
+        rows[(i//n)*n + g//n] += 1
+        cols[(i%n)*n + g%n] += 1
+    vertical = walking_distance_table(n, goal_pos[0]//n)
+    horizontal = walking_distance_table(n, goal_pos[0] % n)
+    return vertical[tuple(rows) + (blank//n,)] + horizontal[tuple(cols) + (blank%n,)]
+
+HEURISTICS = {
+    'manhattan': manhattan,
+    'linear_conflict': linear_conflict,
+    'walking_distance': walking_distance,
+}
+
+def astar_solve(start_state, goal=None, heuristic='manhattan'):
+    """
+    Input: start state of any nxn board, goal (defaults to 0..n*n-1) and a heuristic
+           name from HEURISTICS or a function h(state, goal_pos, n)
+    Output: (state, actions, state_seq, nodes_expanded) or None if unsolvable
+    """
+    n = int(len(start_state)**.5)
+    goal = list(range(n*n)) if goal is None else list(goal)
+    if not is_solvable(start_state, goal):
+        return None
+    h = HEURISTICS[heuristic] if isinstance(heuristic, str) else heuristic
+    goal_pos = goal_positions(goal)
+    table = get_move_table(n)
+    goal_key = tuple(goal)
+
+    start_key = tuple(start_state)
+    h0 = h(start_key, goal_pos, n)
+    # heap of (f, h, g, state tuple, blank), ties go to the node closer to the goal
+    prio_queue = [(h0, h0, 0, start_key, start_state.index(0))]
+    best_g = {start_key: 0}
+    came_from = {start_key: 0}
+    expanded = 0
     while prio_queue:
-        #pop values from prio queue
-        cost, state, path, state_seq  = heapq.heappop(prio_queue)
-        #go to next iteration if visited
-        if tuple(state) in visited:
+        f, h_val, g, key, blank = heapq.heappop(prio_queue)
+        if g > best_g[key]:
             continue
-        visited.add(tuple(state))
-        #if goal rturn
-        if state == [0,1,2,3,4,5,6,7,8]:
-            return cost, state, path, state_seq
-        # check child nodes
-        for action in [1,2,3,4]:
-            next_state = puzzle_move_2(state, action)
-            if next_state != state:
-                if action == 1:
-                    heapq.heappush(prio_queue, ( cost+1.5, next_state, path + [action], state_seq + [tuple(next_state)]))
-                if action == 2:
-                    heapq.heappush(prio_queue, ( cost+.5, next_state, path + [action], state_seq + [tuple(next_state)]))
-                if action == 3:
-                    heapq.heappush(prio_queue, ( cost+1, next_state, path + [action], state_seq + [tuple(next_state)]))
-                if action == 4:
-                    heapq.heappush(prio_queue, ( cost+2, next_state, path + [action], state_seq + [tuple(next_state)]))
+        if key == goal_key:
+            actions, state_seq = rebuild_path(came_from, goal)
+            return goal, actions, state_seq, expanded
+        expanded += 1
+        for action, nb, _, _ in table[blank]:
+            nxt = list(key)
+            nxt[blank], nxt[nb] = nxt[nb], 0
+            nxt = tuple(nxt)
+            if g + 1 < best_g.get(nxt, g + 2):
+                best_g[nxt] = g + 1
+                came_from[nxt] = action
+                h_next = h(nxt, goal_pos, n)
+                heapq.heappush(prio_queue, (g + 1 + h_next, h_next, g + 1, nxt, nb))
     return None
 
+def ida_solve(start_state, goal=None, heuristic='manhattan'):
+    """
+    Input: start state of any nxn board, goal (defaults to 0..n*n-1) and a heuristic
+           name from HEURISTICS or a function h(state, goal_pos, n)
+    Output: (state, actions, state_seq, nodes_expanded) or None if unsolvable
+    memory is only the current path, the built-in heuristics are updated per move instead
+    of recomputed: manhattan by the moved tile, linear conflict by the one line the tile
+    enters or leaves, walking distance by the row (or column) counts key
+    """
+    n = int(len(start_state)**.5)
+    goal = list(range(n*n)) if goal is None else list(goal)
+    if not is_solvable(start_state, goal):
+        return None
+    h = HEURISTICS[heuristic] if isinstance(heuristic, str) else heuristic
+    goal_pos = goal_positions(goal)
+    goal_row = [p//n for p in goal_pos]
+    goal_col = [p % n for p in goal_pos]
+    table = get_move_table(n)
+    # dist[tile][cell] for the incremental manhattan update
+    dist = [[abs(i//n - goal_pos[t]//n) + abs(i%n - goal_pos[t]%n) for i in range(n*n)]
+            for t in range(n*n)]
+
+    state = list(start_state)
+    actions = []
+    expanded = 0
+
+    def row_removals(r):
+        return _line_removals([goal_col[t] for t in state[r*n:(r+1)*n] if t != 0 and goal_row[t] == r])
+
+    def col_removals(c):
+        return _line_removals([goal_row[t] for t in state[c::n] if t != 0 and goal_col[t] == c])
+
+    if h is linear_conflict:
+        # removals per row and column, only the goal line of the moved tile can change
+        lines = ([row_removals(r) for r in range(n)], [col_removals(c) for c in range(n)])
+    elif h is walking_distance:
+        # tile counts per (row, goal row) and (column, goal column), and the current
+        # vertical and horizontal walking distances
+        counts = ([0]*(n*n), [0]*(n*n))
+        for i, tile in enumerate(state):
+            if tile != 0:
+                counts[0][(i//n)*n + goal_row[tile]] += 1
+                counts[1][(i%n)*n + goal_col[tile]] += 1
+        wd_tables = (walking_distance_table(n, goal_row[0]), walking_distance_table(n, goal_col[0]))
+        blank0 = state.index(0)
+        wd = [wd_tables[0][tuple(counts[0]) + (blank0//n,)],
+              wd_tables[1][tuple(counts[1]) + (blank0%n,)]]
+
+    def step(tile, blank, nb, action, h_val):
+        """
+        Input: tile that just slid from nb into blank, the move, h before it
+        Output: (h after the move, undo info for unstep)
+        """
+        # 0 for a vertical move (the tile changes row), 1 for a horizontal one
+        axis = 0 if action <= 2 else 1
+        if h is walking_distance:
+            key = counts[axis]
+            old_line, new_line = (nb//n, blank//n) if axis == 0 else (nb%n, blank%n)
+            g = goal_row[tile] if axis == 0 else goal_col[tile]
+            key[old_line*n + g] -= 1
+            key[new_line*n + g] += 1
+            old = wd[axis]
+            wd[axis] = wd_tables[axis][tuple(key) + (old_line,)]
+            return h_val - old + wd[axis], (axis, old_line, new_line, g, old)
+        h_next = h_val - dist[tile][nb] + dist[tile][blank]
+        if h is linear_conflict:
+            line = goal_row[tile] if axis == 0 else goal_col[tile]
+            if axis == 0 and line in (nb//n, blank//n) or axis == 1 and line in (nb%n, blank%n):
+                old = lines[axis][line]
+                lines[axis][line] = row_removals(line) if axis == 0 else col_removals(line)
+                return h_next + 2*(lines[axis][line] - old), (axis, line, old)
+        return h_next, None
+
+    def unstep(undo):
+        if undo is None:
+            return
+        if h is walking_distance:
+            axis, old_line, new_line, g, old = undo
+            counts[axis][old_line*n + g] += 1
+            counts[axis][new_line*n + g] -= 1
+            wd[axis] = old
+        else:
+            axis, line, old = undo
+            lines[axis][line] = old
+
+    incremental = h in (linear_conflict, walking_distance)
+
+    def search(g, bound, blank, h_val, prev_action):
+        nonlocal expanded
+        f = g + h_val
+        if f > bound:
+            return f
+        if h_val == 0 and state == goal:
+            return -1
+        expanded += 1
+        next_bound = float('inf')
+        for action, nb, _, _ in table[blank]:
+            if action == INVERSE_ACTION.get(prev_action):
+                continue
+            tile = state[nb]
+            state[blank], state[nb] = tile, 0
+            if h is manhattan:
+                h_next, undo = h_val - dist[tile][nb] + dist[tile][blank], None
+            elif incremental:
+                h_next, undo = step(tile, blank, nb, action, h_val)
+            else:
+                h_next, undo = h(state, goal_pos, n), None
+            actions.append(action)
+            t = search(g + 1, bound, nb, h_next, action)
+            if t == -1:
+                return -1
+            actions.pop()
+            unstep(undo)
+            state[blank], state[nb] = 0, tile
+            if t < next_bound:
+                next_bound = t
+        return next_bound
+
+    h0 = h(state, goal_pos, n)
+    bound = h0
+    while True:
+        t = search(0, bound, state.index(0), h0, None)
+        if t == -1:
+            state_seq = [list(start_state)]
+            for action in actions:
+                state_seq.append(puzzle_move_2(state_seq[-1], action))
+            return goal, actions, state_seq, expanded
+        if t == float('inf'):
+            return None
+        bound = t
+
+
+class _SMANode:
+    __slots__ = ('state', 'blank', 'g', 'f', 'depth', 'parent', 'action', 'children',
+                 'forgotten', 'in_open', 'version')
+
+    def __init__(self, state, blank, g, f, parent, action):
+        self.state = state
+        self.blank = blank
+        self.g = g
+        self.f = f
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.parent = parent
+        self.action = action
+        self.children = {} # action -> node in memory
+        self.forgotten = {} # action -> f of a pruned child
+        self.in_open = False
+        self.version = 0
+
+def sma_solve(start_state, goal=None, heuristic='manhattan', max_nodes=10000, stats=None):
+    """
+    Input: start state of any nxn board, goal (defaults to 0..n*n-1), heuristic as in
+           astar_solve, most search nodes kept in memory at once, optional SearchStats
+    Output: (state, actions, state_seq, nodes_expanded) or None if unsolvable or the
+            shallowest solution path does not fit in max_nodes
+    simplified memory-bounded A*: when the node limit is hit the shallowest leaf with the
+    highest f is dropped, its f is remembered by its parent and the parent goes back on
+    the open list so the leaf can be regenerated if it becomes the best choice again
+    """
+    n = int(len(start_state)**.5)
+    goal = list(range(n*n)) if goal is None else list(goal)
+    if not is_solvable(start_state, goal):
+        return None
+    h = HEURISTICS[heuristic] if isinstance(heuristic, str) else heuristic
+    goal_pos = goal_positions(goal)
+    goal_key = tuple(goal)
+    table = get_move_table(n)
+    inf = float('inf')
+
+    # best heap: lowest f, deepest first. worst heap: highest f, shallowest first.
+    best_heap = []
+    worst_heap = []
+    counter = 0
+    open_count = 0
+
+    def push(node):
+        nonlocal counter, open_count
+        if not node.in_open:
+            node.in_open = True
+            open_count += 1
+        node.version += 1
+        counter += 1
+        heapq.heappush(best_heap, (node.f, -node.depth, counter, node.version, node))
+        heapq.heappush(worst_heap, (-node.f, node.depth, counter, node.version, node))
+
+    def remove(node):
+        nonlocal open_count
+        if node.in_open:
+            node.in_open = False
+            open_count -= 1
+            node.version += 1
+
+    def backup(node):
+        # f of a node is the lowest f among its children and the ones it forgot
+        while node is not None:
+            values = [c.f for c in node.children.values()] + list(node.forgotten.values())
+            if not values:
+                return
+            new_f = min(values)
+            if new_f == node.f:
+                return
+            node.f = new_f
+            if node.in_open:
+                push(node)
+            node = node.parent
+
+    start_key = tuple(start_state)
+    root = _SMANode(start_key, start_state.index(0), 0, h(start_key, goal_pos, n), None, 0)
+    push(root)
+    used = peak_used = 1
+    generated = expanded = peak_frontier = 0
+    if stats is not None:
+        stats.start()
+
+    result = None
+    while best_heap:
+        f, _, _, version, node = heapq.heappop(best_heap)
+        if not node.in_open or version != node.version:
+            continue
+        if node.f == inf:
+            break
+        if node.state == goal_key:
+            actions = []
+            walk = node
+            while walk.parent is not None:
+                actions.append(walk.action)
+                walk = walk.parent
+            actions.reverse()
+            state_seq = [list(start_state)]
+            for action in actions:
+                state_seq.append(puzzle_move_2(state_seq[-1], action))
+            result = (goal, actions, state_seq, expanded)
+            break
+
+        # generate every successor that is not in memory (new or forgotten)
+        expanded += 1
+        for action, nb, _, _ in table[node.blank]:
+            if action in node.children:
+                continue
+            nxt = list(node.state)
+            nxt[node.blank], nxt[nb] = nxt[nb], 0
+            nxt = tuple(nxt)
+            ancestor = node
+            while ancestor is not None and ancestor.state != nxt:
+                ancestor = ancestor.parent
+            if ancestor is not None:
+                # moving back onto the current path
+                node.forgotten.pop(action, None)
+                continue
+            generated += 1
+            g = node.g + 1
+            if nxt != goal_key and node.depth + 2 >= max_nodes:
+                # a path this deep can never be completed within the node limit
+                child_f = inf
+            else:
+                child_f = max(node.f, g + h(nxt, goal_pos, n))
+            if action in node.forgotten:
+                child_f = max(child_f, node.forgotten.pop(action))
+            child = _SMANode(nxt, nb, g, child_f, node, action)
+            node.children[action] = child
+            push(child)
+            used += 1
+        remove(node)
+        backup(node)
+        if not node.children and not node.forgotten:
+            # dead end, nothing below it can lead to the goal
+            node.f = inf
+            node.forgotten.clear()
+            if node.parent is not None:
+                del node.parent.children[node.action]
+                node.parent.forgotten[node.action] = inf
+                used -= 1
+                backup(node.parent)
+                if not node.parent.in_open:
+                    push(node.parent)
+
+        # drop the worst leaves until we are back under the limit
+        while used > max_nodes:
+            worst = None
+            while worst_heap:
+                _, _, _, version, leaf = heapq.heappop(worst_heap)
+                if leaf.in_open and version == leaf.version and not leaf.children \
+                        and leaf.parent is not None:
+                    worst = leaf
+                    break
+            if worst is None:
+                break
+            parent = worst.parent
+            remove(worst)
+            del parent.children[worst.action]
+            parent.forgotten[worst.action] = worst.f
+            used -= 1
+            backup(parent)
+            if not parent.in_open:
+                push(parent)
+            elif not parent.children:
+                # parent just became a leaf, let the worst heap see it again
+                push(parent)
+        if used > peak_used:
+            peak_used = used
+        if open_count > peak_frontier:
+            peak_frontier = open_count
+
+    if stats is not None:
+        stats.stop(generated, expanded, peak_frontier, peak_used)
+    return result
+
 
 def main(): 
     print("Part A & B")
@@ -0,0 +1,131 @@
+### Benchmark for the Search_HW solvers
+### python bench_search.py --out bench.json
+### runs a fixed, seeded suite of 3x3 start states and writes one JSON document so runs
+### from different versions can be compared
+import argparse
+import json
+import platform
+import random
+import time
+
+from Search_HW import (SearchStats, astar_solve, bfs_solve, bfs_solve_packed,
+                       bidirectional_bfs_solve, dfs_solve, ida_solve, partG,
+                       puzzle_move_2, ucs_dial_solve, ucs_solve, ucs_solve_2)
+
+GOAL = [0,1,2,3,4,5,6,7,8]
+PART_G_GOAL = [1,2,3,8,0,4,7,6,5]
+
+# name -> (solver(state, stats), goal the suite states are scrambled from)
+SOLVERS = {
+    'bfs': (lambda s, stats: bfs_solve(s, stats=stats), GOAL),
+    'dfs': (lambda s, stats: dfs_solve(s, stats=stats), GOAL),
+    'partG': (lambda s, stats: partG(s, stats=stats), PART_G_GOAL),
+    'ucs': (lambda s, stats: ucs_solve(s, stats=stats), GOAL),
+    'ucs_2': (lambda s, stats: ucs_solve_2(s, stats=stats), GOAL),
+    'ucs_dial': (lambda s, stats: ucs_dial_solve(s, stats=stats), GOAL),
+    # the solvers below are timed only
+    'bfs_packed': (lambda s, stats: bfs_solve_packed(s), GOAL),
+    'bidirectional_bfs': (lambda s, stats: bidirectional_bfs_solve(s), GOAL),
+    'astar': (lambda s, stats: astar_solve(s, GOAL), GOAL),
+    'ida': (lambda s, stats: ida_solve(s, GOAL, 'linear_conflict'), GOAL),
+}
+
+def scramble(goal, moves, rng):
+    """
+    Input: goal state, number of random moves, random source
+    Output: state reached by a walk from goal that never undoes its last move
+    """
+    undo = {1: 2, 2: 1, 3: 4, 4: 3}
+    state = list(goal)
+    last = None
+    done = 0
+    while done < moves:
+        action = rng.randint(1, 4)
+        if action == undo.get(last):
+            continue
+        next_state = puzzle_move_2(state, action)
+        if next_state is state:
+            continue
+        state, last = next_state, action
+        done += 1
+    return state
+
+def make_suite(goal, seeds, walks):
+    """
+    Input: goal, list of seeds, list of walk lengths
+    Output: list of {seed, walk, depth, start} with the optimal depth of each start
+    """
+    suite = []
+    for seed in seeds:
+        for walk in walks:
+            start = scramble(goal, walk, random.Random(seed*1000 + walk))
+            depth = len(bidirectional_bfs_solve(start, goal)[1])
+            suite.append({'seed': seed, 'walk': walk, 'depth': depth, 'start': start})
+    return suite
+
+def run(solvers, seeds, walks, repeat):
+    """
+    Input: solver names, seeds, walk lengths, runs per start (the fastest is kept)
+    Output: JSON-ready dict with per-run records and a per-solver summary
+    """
+    suites = {}
+    results = []
+    for name in solvers:
+        solve, goal = SOLVERS[name]
+        key = tuple(goal)
+        if key not in suites:
+            suites[key] = make_suite(goal, seeds, walks)
+        for case in suites[key]:
+            best = None
+            for _ in range(repeat):
+                stats = SearchStats()
+                start = time.perf_counter()
+                result = solve(list(case['start']), stats)
+                elapsed = time.perf_counter() - start
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, stats, result)
+            elapsed, stats, result = best
+            record = {'solver': name, 'seed': case['seed'], 'walk': case['walk'],
+                      'depth': case['depth'], 'solved': result is not None, 'wall_time': elapsed}
+            if stats._start is not None:
+                record.update(stats.as_dict())
+            results.append(record)
+
+    summary = {}
+    for record in results:
+        s = summary.setdefault(record['solver'], {'runs': 0, 'wall_time': 0.0, 'nodes_expanded': 0})
+        s['runs'] += 1
+        s['wall_time'] += record['wall_time']
+        s['nodes_expanded'] += record.get('nodes_expanded', 0)
+    for s in summary.values():
+        s['nodes_per_sec'] = s['nodes_expanded']/s['wall_time'] if s['nodes_expanded'] else None
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seeds': seeds,
+        'walks': walks,
+        'suite': {' '.join(map(str, goal)): cases for goal, cases in suites.items()},
+        'results': results,
+        'summary': summary,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Search_HW solvers")
+    parser.add_argument('--solvers', type=str, nargs='+', default=list(SOLVERS), choices=list(SOLVERS))
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--walks', type=int, nargs='+', default=[5, 10, 20, 40, 80],
+                        help="scramble lengths, the optimal depth is reported per start")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per start, fastest kept")
+    parser.add_argument('--out', type=str, default=None, help="JSON output file (default stdout)")
+    args = parser.parse_args()
+
+    report = run(args.solvers, args.seeds, args.walks, args.repeat)
+    if args.out is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
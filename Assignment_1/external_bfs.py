@@ -0,0 +1,245 @@
+### Disk-backed breadth-first search with delayed duplicate detection
+### python external_bfs.py --n 4 --workdir /scratch/bfs --memory-mb 512
+### every BFS layer lives on disk as one sorted, zlib compressed file of packed states.
+### successors of a layer are buffered up to the memory budget, sorted and written as runs,
+### then the runs are merged (at most MAX_FAN_IN files at a time) and states already in the
+### previous two layers are dropped
+import argparse
+import heapq
+import os
+import zlib
+
+from Search_HW import get_move_table, pack_state, packed_neighbors, tile_bits
+
+BYTES_PER_BUFFERED_STATE = 64 # rough cost of one int in a Python list, used for the budget
+CHUNK = 1 << 16
+# rough cost of one open reader or writer: compressed chunk, decompressed chunk, zlib
+# window and file buffer
+BYTES_PER_STREAM = 4*CHUNK
+MAX_FAN_IN = 64 # most runs merged at once, well under the usual open file limit
+
+class LayerFormat:
+    ### a record is the packed state with the blank index in the low blank_bits bits, stored
+    ### as a fixed number of big-endian bytes so byte order is the same as numeric order
+    def __init__(self, n):
+        self.n = n
+        self.bits = tile_bits(n)
+        self.blank_bits = (n*n - 1).bit_length()
+        self.blank_mask = (1 << self.blank_bits) - 1
+        self.width = (n*n*self.bits + self.blank_bits + 7)//8
+
+    def pack(self, code, blank):
+        return (code << self.blank_bits) | blank
+
+    def unpack(self, rec):
+        return rec >> self.blank_bits, rec & self.blank_mask
+
+    def write(self, path, records):
+        """
+        Input: output path, sorted iterable of records
+        Output: number of records written
+        """
+        count = 0
+        comp = zlib.compressobj(1)
+        buf = bytearray()
+        with open(path, 'wb') as f:
+            for rec in records:
+                buf += rec.to_bytes(self.width, 'big')
+                count += 1
+                if len(buf) >= CHUNK:
+                    f.write(comp.compress(bytes(buf)))
+                    buf.clear()
+            f.write(comp.compress(bytes(buf)))
+            f.write(comp.flush())
+        return count
+
+    def read(self, path):
+        """
+        Input: path of a file from write
+        Output: generator over its records
+        """
+        decomp = zlib.decompressobj()
+        rest = b''
+        with open(path, 'rb') as f:
+            while True:
+                # input left over from the last call first, so at most CHUNK bytes are
+                # decompressed at a time
+                chunk = decomp.unconsumed_tail or f.read(CHUNK)
+                data = rest + (decomp.decompress(chunk, CHUNK) if chunk else decomp.flush())
+                end = len(data) - len(data) % self.width
+                for i in range(0, end, self.width):
+                    yield int.from_bytes(data[i:i + self.width], 'big')
+                rest = data[end:]
+                if not chunk:
+                    return
+
+def _unique(records):
+    """
+    Input: sorted iterable
+    Output: generator without repeated values
+    """
+    last = None
+    for rec in records:
+        if rec != last:
+            yield rec
+            last = rec
+
+def _subtract(records, *sorted_streams):
+    """
+    Input: sorted iterable, sorted streams to remove from it
+    Output: generator over records found in none of the streams (one streaming merge)
+    """
+    streams = [iter(s) for s in sorted_streams]
+    heads = [next(s, None) for s in streams]
+    for rec in records:
+        drop = False
+        for i, s in enumerate(streams):
+            while heads[i] is not None and heads[i] < rec:
+                heads[i] = next(s, None)
+            if heads[i] == rec:
+                drop = True
+        if not drop:
+            yield rec
+
+def external_bfs(start_state, workdir, memory_mb=256, target=None, max_depth=None,
+                 keep_layers=False, verbose=False):
+    """
+    Input: start state (usually the goal, giving distances to it), scratch directory,
+           memory budget for the successor buffer and the open file buffers, optional
+           target state to stop at,
+           optional depth limit, keep every layer file instead of removing them
+    Output: dict with 'layers' (number of states at each depth) and 'target_depth'
+            (exact distance of target, None if not found or not asked)
+    """
+    n = int(len(start_state)**.5)
+    fmt = LayerFormat(n)
+    table = get_move_table(n)
+    memory = memory_mb*(1 << 20)
+    # expanding reads one layer and writes one run at a time, the buffer gets the rest
+    budget = max(1, (memory - 2*BYTES_PER_STREAM)//BYTES_PER_BUFFERED_STATE)
+    # the last merge also reads the previous two layers and writes the new one
+    fan_in = max(2, min(MAX_FAN_IN, memory//BYTES_PER_STREAM - 3))
+    os.makedirs(workdir, exist_ok=True)
+
+    def layer_path(d):
+        return os.path.join(workdir, "layer_{:03d}.bin".format(d))
+
+    run_count = [0]
+
+    def write_run(records):
+        path = os.path.join(workdir, "run_{:05d}.bin".format(run_count[0]))
+        run_count[0] += 1
+        fmt.write(path, records)
+        return path
+
+    def merge_runs(runs):
+        # merge fan_in runs at a time into longer runs until one merge can take them all
+        while len(runs) > fan_in:
+            merged = []
+            for i in range(0, len(runs), fan_in):
+                group = runs[i:i + fan_in]
+                if len(group) == 1:
+                    merged.append(group[0])
+                    continue
+                merged.append(write_run(_unique(heapq.merge(*[fmt.read(p) for p in group]))))
+                for p in group:
+                    os.remove(p)
+            runs = merged
+        return runs
+
+    def finish(target_depth):
+        # only the last two layers are still on disk unless keep_layers
+        if not keep_layers:
+            for d in (depth - 1, depth):
+                if d >= 0 and os.path.exists(layer_path(d)):
+                    os.remove(layer_path(d))
+        return {'layers': layers, 'target_depth': target_depth}
+
+    code, blank = pack_state(start_state)
+    target_rec = None
+    if target is not None:
+        target_code, target_blank = pack_state(target)
+        target_rec = fmt.pack(target_code, target_blank)
+    start_rec = fmt.pack(code, blank)
+    fmt.write(layer_path(0), [start_rec])
+    layers = [1]
+    depth = 0
+    if start_rec == target_rec:
+        return finish(0)
+
+    while max_depth is None or depth < max_depth:
+        # expand the current layer into sorted runs that fit the budget
+        runs = []
+        buf = []
+        run_count[0] = 0
+        for rec in fmt.read(layer_path(depth)):
+            code, blank = fmt.unpack(rec)
+            for _, nxt, nb in packed_neighbors(code, blank, table):
+                buf.append(fmt.pack(nxt, nb))
+            if len(buf) >= budget:
+                buf.sort()
+                runs.append(write_run(_unique(buf)))
+                buf = []
+        if buf:
+            buf.sort()
+            runs.append(write_run(_unique(buf)))
+            buf = []
+        num_runs = len(runs)
+
+        # merge the runs and drop anything seen in the last two layers
+        runs = merge_runs(runs)
+        merged = _unique(heapq.merge(*[fmt.read(p) for p in runs]))
+        previous = [fmt.read(layer_path(d)) for d in (depth, depth - 1) if d >= 0]
+        found = [False]
+
+        def check(records):
+            for rec in records:
+                if rec == target_rec:
+                    found[0] = True
+                yield rec
+
+        count = fmt.write(layer_path(depth + 1), check(_subtract(merged, *previous)))
+        for p in runs:
+            os.remove(p)
+        if not keep_layers and depth - 1 >= 0:
+            os.remove(layer_path(depth - 1))
+        depth += 1
+        if verbose:
+            print(f"depth {depth}: {count} states, {num_runs} runs")
+        if count == 0:
+            os.remove(layer_path(depth))
+            break
+        layers.append(count)
+        if found[0]:
+            return finish(depth)
+    return finish(None)
+
+def remove_layers(workdir):
+    """
+    Input: scratch directory used by external_bfs
+    removes the layer files a keep_layers run left behind
+    """
+    for name in os.listdir(workdir):
+        if name.startswith('layer_') and name.endswith('.bin'):
+            os.remove(os.path.join(workdir, name))
+
+def main():
+    parser = argparse.ArgumentParser(description="External-memory BFS over sliding puzzle states")
+    parser.add_argument('--n', type=int, default=4, help="board width")
+    parser.add_argument('--start', type=int, nargs='+', default=None, help="start state, defaults to 0..n*n-1")
+    parser.add_argument('--target', type=int, nargs='+', default=None, help="stop when this state is reached")
+    parser.add_argument('--workdir', type=str, default='bfs_layers', help="scratch directory for layer files")
+    parser.add_argument('--memory-mb', type=int, default=256, help="budget for the successor buffer and file buffers")
+    parser.add_argument('--max-depth', type=int, default=None)
+    parser.add_argument('--keep-layers', action='store_true', help="keep every layer file")
+    args = parser.parse_args()
+
+    start = args.start if args.start is not None else list(range(args.n*args.n))
+    result = external_bfs(start, args.workdir, args.memory_mb, args.target, args.max_depth,
+                          args.keep_layers, verbose=True)
+    print(f"total states: {sum(result['layers'])}, deepest layer: {len(result['layers']) - 1}")
+    if args.target is not None:
+        print(f"target depth: {result['target_depth']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+### Additive pattern databases for the sliding puzzle
+### build: python pattern_db.py --n 4 --partition 6-6-3 --out pdb
+### use:   ida_solve(state, heuristic=load_pdbs(glob("pdb/*.pdb")))
+import argparse
+import mmap
+import os
+import time
+from array import array
+
+from Search_HW import get_move_table, goal_positions
+
+MAGIC = b'PDB1'
+
+def pattern_rank(positions, size):
+    """
+    Input: cells of the pattern tiles (in tile order), number of cells
+    Output: index of this placement in 0 .. size!/(size-k)! - 1
+    """
+    rank = 0
+    used = 0
+    for i, p in enumerate(positions):
+        # cells left of p that are still free
+        rank = rank*(size - i) + p - (used & ((1 << p) - 1)).bit_count()
+        used |= 1 << p
+    return rank
+
+def table_size(size, k):
+    """
+    Input: number of cells, number of pattern tiles
+    Output: number of entries in the compact table
+    """
+    total = 1
+    for i in range(k):
+        total *= size - i
+    return total
+
+def build_pdb(n, tiles, goal=None):
+    """
+    Input: board width, tiles in the pattern, goal state (defaults to 0..n*n-1)
+    Output: bytearray, entry pattern_rank(cells of tiles) is the fewest moves of pattern
+            tiles needed to put them at their goal cells
+    backward 0-1 BFS from the goal: the blank is tracked so only legal slides are used,
+    moving the blank through non-pattern cells is free and moving a pattern tile costs 1
+    """
+    size = n*n
+    goal = list(range(size)) if goal is None else list(goal)
+    goal_pos = goal_positions(goal)
+    table = get_move_table(n)
+    k = len(tiles)
+    # queue entries pack the blank in the low bits and the tile cells above it, bits
+    # per cell each
+    bits = (size - 1).bit_length()
+    cell_mask = (1 << bits) - 1
+    if (k + 1)*bits > 64:
+        raise ValueError("{} tiles on a {}x{} board do not fit a 64-bit queue entry".format(k, n, n))
+    entries = table_size(size, k)
+    pdb = bytearray(b'\xff')*entries
+    # one bit per (pattern placement, blank cell)
+    seen = bytearray(entries*size//8 + 1)
+
+    def encode(positions, blank):
+        code = blank
+        for i, p in enumerate(positions):
+            code |= p << (bits*(i+1))
+        return code
+
+    def decode(code):
+        return [(code >> (bits*(j+1))) & cell_mask for j in range(k)], code & cell_mask
+
+    def settled(bit):
+        return seen[bit >> 3] & (1 << (bit & 7))
+
+    start = [goal_pos[t] for t in tiles]
+    next_layer = array('Q', [encode(start, goal_pos[0])])
+    depth = 0
+    filled = 0
+    while next_layer and filled < entries:
+        # settle the entries carried over from the last depth, 0-cost successors are
+        # marked when they are queued so every state enters the layer once
+        layer = array('Q')
+        for code in next_layer:
+            positions, blank = decode(code)
+            bit = pattern_rank(positions, size)*size + blank
+            if not settled(bit):
+                seen[bit >> 3] |= 1 << (bit & 7)
+                layer.append(code)
+        next_layer = array('Q')
+        i = 0
+        while i < len(layer):
+            code = layer[i]
+            i += 1
+            positions, blank = decode(code)
+            rank = pattern_rank(positions, size)
+            if pdb[rank] == 255:
+                pdb[rank] = depth
+                filled += 1
+            for _, nb, _, _ in table[blank]:
+                if nb in positions:
+                    # a pattern tile slides into the blank, costs a move
+                    moved = positions.copy()
+                    moved[positions.index(nb)] = blank
+                    if not settled(pattern_rank(moved, size)*size + nb):
+                        next_layer.append(encode(moved, nb))
+                else:
+                    bit = rank*size + nb
+                    if not settled(bit):
+                        seen[bit >> 3] |= 1 << (bit & 7)
+                        layer.append(encode(positions, nb))
+        depth += 1
+    return pdb
+
+def save_pdb(path, n, tiles, goal, pdb):
+    """
+    Input: output path, board width, pattern tiles, goal state, table from build_pdb
+    writes a small header (magic, n, k, goal, tiles) followed by the raw table
+    """
+    with open(path, 'wb') as f:
+        f.write(MAGIC + bytes([n, len(tiles)]) + bytes(goal) + bytes(tiles))
+        f.write(pdb)
+
+class PatternDatabase:
+    ### disjoint pattern tables opened with mmap, so every solver process shares the
+    ### page cache copy of the files and nothing is rebuilt or read up front
+    def __init__(self, paths):
+        self.groups = [] # (tiles, mmap, offset into the mapping)
+        self.n = None
+        self.goal = None
+        for path in paths:
+            with open(path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if mm[:4] != MAGIC:
+                raise ValueError("{} is not a pattern database".format(path))
+            n, k = mm[4], mm[5]
+            goal = list(mm[6:6 + n*n])
+            tiles = list(mm[6 + n*n:6 + n*n + k])
+            if self.n is None:
+                self.n, self.goal = n, goal
+            elif (n, goal) != (self.n, self.goal):
+                raise ValueError("{} was built for a different board or goal".format(path))
+            self.groups.append((tiles, mm, 6 + n*n + k))
+
+    def __call__(self, state, goal_pos=None, n=None):
+        """
+        Input: state (goal_pos and n are accepted so it can be passed as a heuristic)
+        Output: sum of the pattern table entries, an admissible estimate
+        """
+        size = self.n*self.n
+        where = [0]*size
+        for i, tile in enumerate(state):
+            where[tile] = i
+        total = 0
+        for tiles, mm, offset in self.groups:
+            total += mm[offset + pattern_rank([where[t] for t in tiles], size)]
+        return total
+
+    def close(self):
+        for _, mm, _ in self.groups:
+            mm.close()
+
+def load_pdbs(paths):
+    """
+    Input: paths of files written by save_pdb with disjoint tile sets
+    Output: PatternDatabase usable as the heuristic of astar_solve/ida_solve
+    """
+    return PatternDatabase(paths)
+
+def parse_partition(spec, n):
+    """
+    Input: partition like "6-6-3", board width
+    Output: list of tile groups taking tiles 1..n*n-1 in order
+    """
+    sizes = [int(s) for s in spec.split('-')]
+    if sum(sizes) != n*n - 1:
+        raise ValueError("partition {} does not cover the {} tiles".format(spec, n*n - 1))
+    groups = []
+    tile = 1
+    for s in sizes:
+        groups.append(list(range(tile, tile + s)))
+        tile += s
+    return groups
+
+def main():
+    parser = argparse.ArgumentParser(description="Build additive pattern databases")
+    parser.add_argument('--n', type=int, default=4, help="board width")
+    parser.add_argument('--partition', type=str, default='6-6-3', help="group sizes, e.g. 7-8 or 6-6-3")
+    parser.add_argument('--goal', type=int, nargs='+', default=None, help="goal state, defaults to 0..n*n-1")
+    parser.add_argument('--out', type=str, default='pdb', help="output directory")
+    args = parser.parse_args()
+
+    goal = args.goal if args.goal is not None else list(range(args.n*args.n))
+    os.makedirs(args.out, exist_ok=True)
+    for tiles in parse_partition(args.partition, args.n):
+        path = os.path.join(args.out, "pdb_{}_{}.pdb".format(args.n, "-".join(map(str, tiles))))
+        start = time.time()
+        pdb = build_pdb(args.n, tiles, goal)
+        save_pdb(path, args.n, tiles, goal, pdb)
+        print(f"{path}: {len(pdb)} entries, max {max(pdb)}, {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
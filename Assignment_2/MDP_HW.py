@@ -2,6 +2,24 @@
 ### CPSC 4420
 ### Kevius Tribble
 import argparse
+import hashlib
+import heapq
+import numbers
+import os
+import time
+from collections.abc import Mapping, Sequence
+from functools import partial
+import numpy as np
+try:
+    from scipy import sparse
+    from scipy.sparse.linalg import spsolve
+except ImportError: # scipy is only needed for exact policy evaluation on big grids
+    sparse = None
+
+BLOCKED = 1 # cell bit for obstacles and off-grid cells, bit d is a wall in direction d
+ACTION_COSTS = {1: -1.0, 2: -1.5, 3:-0.5, 4:-0.5} #foward 1 cell, forward 2 cell, turn left, turn right
+DX = np.array([0, 0, 1, 0, -1]) # indexed by direction 1..4
+DY = np.array([0, 1, 0, -1, 0])
 
 ### represent MDP as a class
 class MDPenv:
@@ -10,39 +28,224 @@ class MDPenv:
         self.grid_size = grid_size #interger for nxn grid
         self.terminal_states = terminal_states #dictionary of terminal states and their reward
         self.walls = walls # dictionarry with cell as key and blocked cells as list of tuples
-        self.states = [] # list of all states (x,y,d)
-        self.actions = {1: -1.0, 2: -1.5, 3:-0.5, 4:-0.5} #foward 1 cell, forward 2 cell, turn left, turn right
+        self.states = StateList(self) # all states (x,y,d), backed by the arrays below
+        self.actions = dict(ACTION_COSTS) # action -> cost
         self.obstacles = obstacles # set of (x,y) pairs representing blocked cells
 
-        ### populate list of states
-        for x in range(1, self.grid_size+1):
-            for y in range(1, self.grid_size+1):
-                if (x,y) not in obstacles:
-                    for dir in range(1,5):
-                        self.states.append((x,y,dir)) # 1 = up, 2 = right, 3 = down, 4 = left
+        self.build_cells()
+        ### populate the states, x then y then direction 1 = up, 2 = right, 3 = down, 4 = left
+        p, n = self.pad, self.grid_size
+        cx, cy = np.nonzero((self.cells[p+1:p+n+1, p+1:p+n+1] & BLOCKED) == 0)
+        self.xs = np.repeat(cx + 1, 4).astype(np.int32)
+        self.ys = np.repeat(cy + 1, 4).astype(np.int32)
+        self.ds = np.tile(np.arange(1, 5, dtype=np.int32), len(cx))
+
+        self.compile()
+
+    def build_cells(self):
+        """
+        builds self.cells[x+pad, y+pad], one byte per cell padded by 2 on each side:
+        bit 0 (BLOCKED) is set off the grid and on obstacles, bit d is set when the edge
+        leaving the cell in direction d has a wall, from either of the two cells' lists
+        """
+        n = self.grid_size
+        pad = 2 # forward 2 can look two cells past the edge
+        self.pad = pad
+        cells = np.full((n + 1 + 2*pad, n + 1 + 2*pad), BLOCKED, dtype=np.uint8)
+        cells[pad+1:pad+n+1, pad+1:pad+n+1] = 0
+        for (x, y) in self.obstacles:
+            if 1 <= x <= n and 1 <= y <= n:
+                cells[x+pad, y+pad] |= BLOCKED
+        own = np.zeros_like(cells)
+        for (x, y), blocked in self.walls.items():
+            if 1 <= x <= n and 1 <= y <= n:
+                for d in range(1, 5):
+                    if (x + DX[d], y + DY[d]) in blocked:
+                        own[x+pad, y+pad] |= 1 << d
+        cells |= own
+        for d in range(1, 5):
+            # the neighbour in direction d walls off the same edge with its opposite bit
+            opposite = (d + 1) % 4 + 1
+            neighbour = np.roll(own, (-DX[d], -DY[d]), axis=(0, 1))
+            cells |= np.where(neighbour & (1 << opposite), 1 << d, 0).astype(np.uint8)
+        self.cells = cells
+
+    def compile(self):
+        """
+        builds the array form of the model, row i is self.states[i] and column j is action j+1
+        self.index[x, y, d]   -> state index, -1 for cells off the grid or obstacles
+        self.next_state[S, A] -> index of the state transition() moves to
+        self.reward[S, A]     -> reward transition() returns
+        self.terminal[S]      -> True for states on a terminal cell
+        gives the same results as transition(), including its forward 2 intermediate cell
+        """
+        n = self.grid_size
+        pad = self.pad
+
+        # valid[x+pad, y+pad, d] is is_state_valid((x, y, d))
+        valid = np.zeros(self.cells.shape + (5,), dtype=bool)
+        for d in range(1, 5):
+            valid[:, :, d] = (self.cells & (BLOCKED | 1 << d)) == 0
+        bonus = np.zeros(valid.shape[:2])
+        is_terminal = np.zeros(valid.shape[:2], dtype=bool)
+        for (x, y), r in self.terminal_states.items():
+            if 1 <= x <= n and 1 <= y <= n:
+                bonus[x+pad, y+pad] = r
+                is_terminal[x+pad, y+pad] = True
+
+        xs, ys, ds = self.xs.astype(np.int64), self.ys.astype(np.int64), self.ds.astype(np.int64)
+        S = len(self.xs)
+        itype = np.int32 if S < 2**31 else np.int64
+        self.index = np.full(valid.shape, -1, dtype=itype)
+        self.index[xs+pad, ys+pad, ds] = np.arange(S)
+        self.terminal = is_terminal[xs+pad, ys+pad]
+
+        # (x, y, d) reached by each action, and whether transition() accepts it
+        moves = [
+            (xs + DX[ds], ys + DY[ds], ds, None),
+            (xs + 2*DX[ds], ys + 2*DY[ds], ds, (xs, ys + 1, ds)), # intermediate is always (x, y+1)
+            (xs, ys, ds % 4 + 1, None),
+            (xs, ys, (ds - 2) % 4 + 1, None),
+        ]
+        self.next_state = np.empty((S, len(moves)), dtype=itype)
+        self.reward = np.empty((S, len(moves)))
+        rows = np.arange(S)
+        for j, (nx, ny, nd, inter) in enumerate(moves):
+            ok = valid[nx+pad, ny+pad, nd]
+            if inter is not None:
+                ix, iy, idir = inter
+                ok &= valid[ix+pad, iy+pad, idir]
+            self.next_state[:, j] = np.where(ok, self.index[nx+pad, ny+pad, nd], rows)
+            self.reward[:, j] = self.actions[j+1] + np.where(ok, bonus[nx+pad, ny+pad], 0)
+        self.next_state[self.terminal] = rows[self.terminal, None]
+        self.reward[self.terminal] = 0
+        self._predecessors = None
+
+    def state_index(self, state):
+        """
+        Input: (x, y, d) tuple
+        Output: its row in the compiled arrays, -1 if it is not a state
+        """
+        x, y, d = state
+        p = self.pad
+        if not (-p <= x <= self.grid_size + p and -p <= y <= self.grid_size + p and 1 <= d <= 4):
+            return -1
+        return int(self.index[x+p, y+p, d])
+
+    def predecessors(self):
+        """
+        Output: (ptr, pred) in CSR layout, pred[ptr[s]:ptr[s+1]] are the states other than s
+                that some action moves to s, built once and cached
+        """
+        if self._predecessors is None:
+            S, A = self.next_state.shape
+            src = np.repeat(np.arange(S), A)
+            dst = self.next_state.ravel().astype(np.int64)
+            keep = src != dst
+            pairs = np.unique(dst[keep]*S + src[keep]) # sorted by destination
+            ptr = np.zeros(S + 1, dtype=np.int64)
+            np.cumsum(np.bincount(pairs // S, minlength=S), out=ptr[1:])
+            self._predecessors = (ptr, pairs % S)
+        return self._predecessors
+
+    def transition_matrices(self, noise=0.0):
+        """
+        Input: probability of an action other than the chosen one
+        Output: one (indptr, indices, data) CSR triple per chosen action, row s holds the
+                chance of landing in each state when that action is chosen in s.
+                memory is proportional to the nonzeros, at most A per row
+        """
+        S, A = self.next_state.shape
+        mix = noise_matrix(A, noise)
+        order = np.argsort(self.next_state, axis=1, kind='stable')
+        cols = np.take_along_axis(self.next_state, order, axis=1)
+        # first of each run of equal next states in a sorted row
+        first = np.ones((S, A), dtype=bool)
+        first[:, 1:] = cols[:, 1:] != cols[:, :-1]
+        starts = np.flatnonzero(first)
+        rows = starts // A
+        indices = cols.ravel()[starts]
+        matrices = []
+        for a in range(A):
+            weights = mix[a][order].ravel()
+            data = np.add.reduceat(weights, starts) # executed actions that land together
+            keep = data > 0
+            indptr = np.zeros(S + 1, dtype=np.int64)
+            np.cumsum(np.bincount(rows[keep], minlength=S), out=indptr[1:])
+            matrices.append((indptr, indices[keep], data[keep]))
+        return matrices
 
     def is_state_valid(self, state):
         x,y,d = state
-        #check bounds
-        if x < 1 or x > self.grid_size or y < 1 or y > self.grid_size:
-            return False
-        #check for obstacle
-        if (x,y) in self.obstacles:
+        p = self.pad
+        #off the padded grid is always out of bounds
+        if not (-p <= x <= self.grid_size + p and -p <= y <= self.grid_size + p):
             return False
-        #check walls
-        if (x,y) in self.walls:
-            for wall in self.walls[(x,y)]:
-                if d == 1 and wall == (x, y+1): #facing up check
-                    return False
-                if d == 2 and wall == (x+1,y): #face right check
-                    return False
-                if d == 3 and wall == (x, y-1): # face down check
-                    return False
-                if d == 4 and wall == (x-1, y): #face left check
-                    return False
-        return True
-    
-    
+        #bounds, obstacle and the wall ahead are all bits of the cell
+        return not self.cells[x+p, y+p] & (BLOCKED | 1 << d)
+
+    def layout_arrays(self):
+        """
+        Output: (cells, terminals), the grid_size x grid_size wall/obstacle bytes (see
+                build_cells) and one x, y, reward row per terminal state
+        """
+        p, n = self.pad, self.grid_size
+        terminals = np.array([(x, y, r) for (x, y), r in sorted(self.terminal_states.items())],
+                             dtype=float).reshape(-1, 3)
+        return self.cells[p+1:p+n+1, p+1:p+n+1], terminals
+
+    def save_layout(self, path):
+        """
+        Input: file path
+        writes layout_arrays() as a compressed .npz
+        """
+        cells, terminals = self.layout_arrays()
+        np.savez_compressed(path, cells=cells, terminals=terminals)
+
+    @classmethod
+    def load_layout(cls, path):
+        """
+        Input: file written by save_layout
+        Output: MDPenv with the same grid, walls, obstacles and terminal states
+        """
+        with np.load(path) as data:
+            return cls.from_arrays(data['cells'], data['terminals'])
+
+    @classmethod
+    def from_arrays(cls, cells, terminals, tables=None, actions=None):
+        """
+        Input: arrays from layout_arrays, optional dict with the xs, ys, ds, index, terminal,
+               next_state and reward arrays of the compiled model, optional action -> cost
+               dict (defaults to ACTION_COSTS)
+        Output: MDPenv for the layout, given tables are used as they are instead of
+                running compile()
+        """
+        n = cells.shape[0]
+        obstacles = {(int(x) + 1, int(y) + 1) for x, y in zip(*np.nonzero(cells & BLOCKED))}
+        walls = {}
+        for d in range(1, 5):
+            for x, y in zip(*np.nonzero(cells & (1 << d))):
+                x, y = int(x) + 1, int(y) + 1
+                walls.setdefault((x, y), []).append((x + int(DX[d]), y + int(DY[d])))
+        terminal_states = {(int(x), int(y)): r for x, y, r in terminals.tolist()}
+        if tables is None:
+            mdp = cls(n, terminal_states, walls, obstacles)
+            if actions is not None and dict(actions) != mdp.actions:
+                mdp.actions = dict(actions)
+                mdp.compile()
+            return mdp
+        mdp = cls.__new__(cls)
+        mdp.grid_size, mdp.terminal_states = n, terminal_states
+        mdp.walls, mdp.obstacles = walls, obstacles
+        mdp.states = StateList(mdp)
+        mdp.actions = dict(ACTION_COSTS if actions is None else actions)
+        mdp.build_cells()
+        for name in ('xs', 'ys', 'ds', 'index', 'terminal', 'next_state', 'reward'):
+            setattr(mdp, name, tables[name])
+        mdp._predecessors = None
+        return mdp
+
+    ### reference model for one step, compile() tabulates it for every state
     def transition(self, state, action):
         x,y,d = state
         if (x,y) in self.terminal_states:
@@ -89,53 +292,527 @@ class MDPenv:
         else:
             return state, reward
                     
+class StateList(Sequence):
+    ### read-only list of (x, y, d) tuples over MDPenv's coordinate arrays, so a state
+    ### costs 12 bytes instead of a tuple of three ints
+    def __init__(self, mdp):
+        self.mdp = mdp
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return (int(self.mdp.xs[i]), int(self.mdp.ys[i]), int(self.mdp.ds[i]))
+
+    def __len__(self):
+        return len(self.mdp.xs)
+
+    def __iter__(self):
+        return zip(self.mdp.xs.tolist(), self.mdp.ys.tolist(), self.mdp.ds.tolist())
+
+    def __contains__(self, state):
+        return len(state) == 3 and self.mdp.state_index(state) >= 0
+
+    def index(self, state):
+        i = self.mdp.state_index(state)
+        if i < 0:
+            raise ValueError(f"{state} is not a state")
+        return i
+
+def csr_to_scipy(matrix, num_states):
+    """
+    Input: (indptr, indices, data) from MDPenv.transition_matrices, number of states
+    Output: scipy.sparse.csr_matrix of the same matrix
+    """
+    if sparse is None:
+        raise ImportError("csr_to_scipy needs scipy")
+    indptr, indices, data = matrix
+    return sparse.csr_matrix((data, indices, indptr), shape=(num_states, num_states))
+
+def noise_matrix(num_actions, noise):
+    """
+    Input: number of actions, probability of an action other than the chosen one
+    Output: [A, A] array, row a is the chance of each action running when a is chosen
+    """
+    mix = np.full((num_actions, num_actions), noise/(num_actions-1))
+    np.fill_diagonal(mix, 1 - noise)
+    return mix
+
+class PolicyArray(Mapping):
+    ### read-only state -> action view of an array of action columns, so a stored
+    ### policy costs one byte per state instead of a dict entry
+    def __init__(self, mdp, best):
+        self.mdp = mdp
+        self.best = np.asarray(best, dtype=np.int8)
+        self.actions = list(mdp.actions.keys())
+
+    def __getitem__(self, state):
+        s = self.mdp.state_index(state)
+        if s < 0:
+            raise KeyError(state)
+        return self.actions[self.best[s]]
+
+    def __iter__(self):
+        return iter(self.mdp.states)
+
+    def __len__(self):
+        return len(self.best)
+
+def bellman_backup(MDPenv, v, gamma, mix):
+    """
+    Input: MDPenv, value array, reward decay, matrix from noise_matrix
+    Output: (new value array, index of the best action for each state)
+    """
+    # value of running each action from each state, then mixed by the noise model
+    q = (MDPenv.reward + gamma*v[MDPenv.next_state]) @ mix.T
+    best = q.argmax(axis=1) # first best action on ties
+    return q[np.arange(len(q)), best], best
+
+def in_place_q(MDPenv, v, gamma, mix, rows):
+    """
+    Input: MDPenv, value array, reward decay, matrix from noise_matrix, state indices
+    Output: [len(rows), A] action values with each state's own value solved for, as a
+            Gauss-Seidel row update does: q = c + k*q gives q = c/(1-k), where k is the
+            discounted chance of staying put (blocked moves and turns that fail)
+    """
+    nxt = MDPenv.next_state[rows]
+    stay = nxt == rows[:, None]
+    c = (MDPenv.reward[rows] + gamma*np.where(stay, 0.0, v[nxt])) @ mix.T
+    k = (gamma*stay) @ mix.T
+    solvable = k < 1 - 1e-12
+    # gamma = 1 and every action stays put: no fixed point, back up as usual
+    return np.where(solvable, c/np.where(solvable, 1 - k, 1), c + k*v[rows, None])
+
+def sweep_layers(MDPenv):
+    """
+    Input: MDPenv
+    Output: list of state index arrays, layer k holds the states k moves from a terminal
+            (reverse BFS over the predecessor lists), states that cannot reach one come last
+    """
+    ptr, pred = MDPenv.predecessors()
+    seen = MDPenv.terminal.copy()
+    frontier = np.flatnonzero(seen)
+    layers = []
+    while len(frontier):
+        layers.append(frontier)
+        starts, counts = ptr[frontier], ptr[frontier+1] - ptr[frontier]
+        # gather every pred[starts[i]:starts[i]+counts[i]] in one index array
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        frontier = np.unique(pred[np.repeat(starts, counts) + offsets])
+        frontier = frontier[~seen[frontier]]
+        seen[frontier] = True
+    if not seen.all():
+        layers.append(np.flatnonzero(~seen))
+    return layers
+
+def value_iteration_steps(MDPenv, gamma, noise, iterations=None, epsilon=None, v=None, mode='sync'):
+    """
+    Input: MDPenv, reward decay, noise, most sweeps (None for no limit), stop once the
+           residual is at most epsilon (None to run every sweep), starting values,
+           mode = 'sync' (every state from the previous sweep's values),
+                  'gauss_seidel' (in place, layer by layer outward from the terminals),
+                  'prioritized' (one state at a time, largest Bellman error first)
+    Output: generator with one dict per sweep:
+            iteration, residual (largest value change), changed (states whose best
+            action changed), elapsed (seconds for the sweep), v, best (action columns),
+            backups (state backups so far)
+    a prioritized 'sweep' is len(states) backups, its residual is the largest Bellman
+    error still queued and it stops once none is above epsilon (1e-6 when None)
+    """
+    mix = noise_matrix(len(MDPenv.actions), noise)
+    S = len(MDPenv.states)
+    v = np.zeros(S) if v is None else np.array(v, dtype=float)
+    best = np.full(S, -1)
+    if mode == 'prioritized':
+        yield from _prioritized_sweeps(MDPenv, gamma, mix, iterations, epsilon, v)
+        return
+    if mode not in ('sync', 'gauss_seidel'):
+        raise ValueError(f"unknown mode {mode!r}")
+    layers = sweep_layers(MDPenv) if mode == 'gauss_seidel' else None
+    i = 0
+    while iterations is None or i < iterations:
+        start = time.perf_counter()
+        if layers is None:
+            v_new, best_new = bellman_backup(MDPenv, v, gamma, mix)
+            residual = float(np.abs(v_new - v).max()) if S else 0.0
+        else:
+            v_new, best_new = v.copy(), best.copy()
+            for layer in layers:
+                # each layer reads the values the layers before it just wrote
+                q = in_place_q(MDPenv, v_new, gamma, mix, layer)
+                b = q.argmax(axis=1)
+                v_new[layer] = q[np.arange(len(layer)), b]
+                best_new[layer] = b
+            residual = float(np.abs(v_new - v).max()) if S else 0.0
+        changed = int((best_new != best).sum())
+        v, best = v_new, best_new
+        i += 1
+        yield {'iteration': i, 'residual': residual, 'changed': changed,
+               'elapsed': time.perf_counter() - start, 'v': v, 'best': best, 'backups': i*S}
+        if epsilon is not None and residual <= epsilon:
+            return
+
+def _prioritized_sweeps(MDPenv, gamma, mix, iterations, epsilon, v):
+    S = len(MDPenv.states)
+    theta = 1e-6 if epsilon is None else epsilon
+    ptr, pred = MDPenv.predecessors()
+    # one state at a time, so plain lists beat numpy on a 4x4 slice
+    nxt, rew, mix_rows = MDPenv.next_state.tolist(), MDPenv.reward.tolist(), mix.tolist()
+    ptr, pred = ptr.tolist(), pred.tolist()
+
+    def backup(s):
+        # in_place_q for one state, returns (value, best action)
+        ns, rs = nxt[s], rew[s]
+        best_q, best_a = None, 0
+        for a, weights in enumerate(mix_rows):
+            c = k = 0.0
+            for w, n, r in zip(weights, ns, rs):
+                if n == s:
+                    c += w*r
+                    k += w*gamma
+                else:
+                    c += w*(r + gamma*values[n])
+            q = c/(1 - k) if k < 1 - 1e-12 else c + k*values[s]
+            if best_q is None or q > best_q:
+                best_q, best_a = q, a
+        return best_q, best_a
+
+    values = v.tolist()
+    best = [0]*S
+    queued = [0.0]*S
+    heap = [] # max-heap of (-error, state), stale entries are skipped when popped
+    for s in range(S):
+        value, best[s] = backup(s)
+        err = abs(value - values[s])
+        if err > theta:
+            queued[s] = err
+            heap.append((-err, s))
+    heapq.heapify(heap)
+    backups = 0
+    i = 0
+    while iterations is None or i < iterations:
+        start = time.perf_counter()
+        best_before = list(best)
+        done = 0
+        while heap and done < S:
+            e, s = heapq.heappop(heap)
+            if -e != queued[s]:
+                continue
+            queued[s] = 0.0
+            values[s], best[s] = backup(s)
+            done += 1
+            for p in pred[ptr[s]:ptr[s+1]]:
+                value, best[p] = backup(p)
+                err = abs(value - values[p])
+                if err > theta and err > queued[p]:
+                    queued[p] = err
+                    heapq.heappush(heap, (-err, p))
+        backups += done
+        i += 1
+        yield {'iteration': i, 'residual': max(queued, default=0.0),
+               'changed': sum(b != a for a, b in zip(best_before, best)),
+               'elapsed': time.perf_counter() - start, 'v': np.array(values),
+               'best': np.array(best, dtype=np.int64), 'backups': backups}
+        if not heap:
+            return
+
+def policy_backup(MDPenv, v, gamma, mix, best):
+    """
+    Input: MDPenv, value array, reward decay, matrix from noise_matrix, action columns
+    Output: value array after one backup that follows the given policy
+    """
+    q = MDPenv.reward + gamma*v[MDPenv.next_state]
+    return (q * mix[best]).sum(axis=1)
+
+def evaluate_policy_exact(MDPenv, gamma, mix, best):
+    """
+    Input: MDPenv, reward decay (< 1), matrix from noise_matrix, action columns
+    Output: value array of the policy from one linear solve (I - gamma*P) v = r,
+            sparse when scipy is installed, dense otherwise
+    """
+    S, A = MDPenv.next_state.shape
+    weights = mix[best] # [S, A] chance of each action running in each state
+    r = (MDPenv.reward * weights).sum(axis=1)
+    if sparse is not None:
+        # A entries per row, scipy sums the ones that land in the same state
+        P = sparse.csr_matrix((weights.ravel(), MDPenv.next_state.ravel(),
+                               np.arange(0, S*A + 1, A)), shape=(S, S))
+        return spsolve((sparse.identity(S, format='csr') - gamma*P).tocsc(), r)
+    P = np.zeros((S, S))
+    rows = np.arange(S)
+    for j in range(A):
+        np.add.at(P, (rows, MDPenv.next_state[:, j]), weights[:, j])
+    return np.linalg.solve(np.eye(S) - gamma*P, r)
+
+def improve_policy(MDPenv, v, gamma, mix, best):
+    """
+    Input: MDPenv, value array, reward decay, matrix from noise_matrix, current action columns
+    Output: greedy action columns, keeping the current action where it ties the best one
+    """
+    q = (MDPenv.reward + gamma*v[MDPenv.next_state]) @ mix.T
+    greedy = q.argmax(axis=1)
+    if best is None:
+        return greedy
+    rows = np.arange(len(q))
+    keep = q[rows, best] >= q[rows, greedy] - 1e-12*np.maximum(1, np.abs(q[rows, greedy]))
+    return np.where(keep, best, greedy)
+
+def policy_iteration_steps(MDPenv, gamma, noise, iterations=None, eval_sweeps=None,
+                           exact_limit=None, epsilon=None, v=None):
+    """
+    Input: MDPenv, reward decay, noise, most outer iterations (None for no limit),
+           evaluation sweeps per iteration (None for exact evaluation), most states
+           for the exact linear solve (None for 20000 with scipy, 2000 without),
+           stop once the residual is at most epsilon,
+           starting values
+    Output: generator with one dict per improvement step, same keys as
+            value_iteration_steps plus sweeps (evaluation sweeps so far)
+    exact evaluation needs gamma < 1 and at most exact_limit states, otherwise
+    eval_sweeps (20 when None) backups of the current policy are run instead.
+    stops once no action changes, or the residual is at most epsilon
+    """
+    mix = noise_matrix(len(MDPenv.actions), noise)
+    S = len(MDPenv.states)
+    v = np.zeros(S) if v is None else np.asarray(v, dtype=float)
+    if exact_limit is None:
+        exact_limit = 2000 if sparse is None else 20000
+    exact = eval_sweeps is None and gamma < 1 and S <= exact_limit
+    k = 20 if eval_sweeps is None else eval_sweeps
+    best = improve_policy(MDPenv, v, gamma, mix, None)
+    sweeps = 0
+    i = 0
+    while iterations is None or i < iterations:
+        start = time.perf_counter()
+        v_old = v
+        if exact:
+            v = evaluate_policy_exact(MDPenv, gamma, mix, best)
+        else:
+            for _ in range(k):
+                v = policy_backup(MDPenv, v, gamma, mix, best)
+        sweeps += 1 if exact else k
+        best_new = improve_policy(MDPenv, v, gamma, mix, best)
+        residual = float(np.abs(v - v_old).max()) if S else 0.0
+        changed = int((best_new != best).sum())
+        best = best_new
+        i += 1
+        yield {'iteration': i, 'residual': residual, 'changed': changed,
+               'elapsed': time.perf_counter() - start, 'v': v, 'best': best, 'sweeps': sweeps}
+        if changed == 0 and (exact or epsilon is None):
+            return
+        if epsilon is not None and residual <= epsilon:
+            return
+
+def policy_iteration(MDPenv, gamma, noise, iterations=100, print_data=True, exact_limit=None,
+                     epsilon=1e-6):
+    # evaluates each policy exactly, falls back to 20 sweeps per policy when the
+    # grid is too big for an exact solve or gamma = 1, then epsilon decides when to stop
+    return _run_policy_iteration(MDPenv, gamma, noise, iterations, print_data,
+                                 None, exact_limit, epsilon)
+
+def modified_policy_iteration(MDPenv, gamma, noise, k=20, iterations=100, print_data=True,
+                              epsilon=1e-6):
+    # k = backups of the current policy between improvement steps
+    return _run_policy_iteration(MDPenv, gamma, noise, iterations, print_data, k, 0, epsilon)
+
+def _run_policy_iteration(MDPenv, gamma, noise, iterations, print_data, eval_sweeps,
+                          exact_limit, epsilon):
+    actions = list(MDPenv.actions.keys())
+    best = None
+    for record in policy_iteration_steps(MDPenv, gamma, noise, iterations, eval_sweeps,
+                                         exact_limit, epsilon):
+        best = record['best']
+        if print_data and record['iteration'] <= 10:
+            print(f"iteration {record['iteration']}: residual {record['residual']:.4g}, "
+                  f"changed {record['changed']}, sweeps {record['sweeps']}")
+            for state, value, b in zip(MDPenv.states, record['v'].tolist(), best.tolist()):
+                print(f"State: {state}, Value: {value:.2f}, Best Action: {actions[b]}")
+    # one policy, optimal_path reuses the last entry for every step
+    return [] if best is None else [PolicyArray(MDPenv, best)]
+
+def batch_value_iteration(configs, iterations=1000, epsilon=1e-6):
+    """
+    Input: list of (MDPenv, gamma, noise), most sweeps, residual each config stops at
+    Output: list with one dict per config: iteration (sweeps until it stopped), residual,
+            v, best (action columns), same as the last value_iteration_steps record
+    every config is one block of a stacked table and all blocks are backed up together,
+    an environment that appears in several configs is compiled once
+    """
+    K = len(configs)
+    if K == 0:
+        return []
+    A = configs[0][0].next_state.shape[1]
+    sizes = np.array([len(mdp.states) for mdp, _, _ in configs], dtype=np.int64)
+    offsets = np.zeros(K + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    next_state = np.concatenate([mdp.next_state + off for (mdp, _, _), off in zip(configs, offsets)])
+    reward = np.concatenate([mdp.reward for mdp, _, _ in configs])
+    owner = np.repeat(np.arange(K), sizes)
+    gamma = np.array([g for _, g, _ in configs], dtype=float)[owner, None]
+    noise = np.array([n for _, _, n in configs], dtype=float)[owner, None]
+    # q @ noise_matrix(A, noise).T is (1-noise)*q_b + noise/(A-1)*(sum of the other q)
+    own, spread = 1 - noise - noise/(A-1), noise/(A-1)
+
+    v = np.zeros(len(next_state))
+    best = np.zeros(len(next_state), dtype=np.int64)
+    active = sizes > 0
+    done_at = np.zeros(K, dtype=np.int64)
+    residual = np.zeros(K)
+    i = 0
+    while active.any() and i < iterations:
+        # tables of the configs still running, rebuilt only when one of them stops
+        rows = np.flatnonzero(active[owner])
+        starts = np.searchsorted(rows, offsets[:-1][active])
+        nxt, rew, g, o, sp = next_state[rows], reward[rows], gamma[rows], own[rows], spread[rows]
+        running = active.copy()
+        while (running == active).all() and i < iterations:
+            q = rew + g*v[nxt] # next states index the full v
+            q = o*q + sp*q.sum(axis=1, keepdims=True)
+            b = q.argmax(axis=1) # first best action on ties
+            v_new = q[np.arange(len(q)), b]
+            change = np.abs(v_new - v[rows])
+            v[rows] = v_new
+            best[rows] = b
+            i += 1
+            residual[active] = np.maximum.reduceat(change, starts)
+            done_at[active] = i
+            active &= residual > epsilon
+    return [{'iteration': int(done_at[k]), 'residual': float(residual[k]),
+             'v': v[offsets[k]:offsets[k+1]], 'best': best[offsets[k]:offsets[k+1]]}
+            for k in range(K)]
+
 ### make a function that uses the MDP_ENV class to do value iteration
-def value_iteration(MDPenv, gamma, noise, iterations, print_data=True):
+def value_iteration(MDPenv, gamma, noise, iterations=100, print_data=True, epsilon=None,
+                    keep_policies=False, mode='sync'):
     # gamma = reward decay
     # noise = probability of incorrect action 
-    v = {s: 0 for s in  MDPenv.states}
-    policy = {s: 0 for s in MDPenv.states}
-    full_policy = [list() for i in range(iterations)]
+    # epsilon = stop early once no value moves more than this
+    # keep_policies = store the policy of every sweep instead of only the last one
+    # mode = 'sync', 'gauss_seidel' or 'prioritized', see value_iteration_steps
     actions = list(MDPenv.actions.keys())
+    v = np.zeros(len(MDPenv.states))
+    best = None
+    full_policy = []
     #for each iteration calculate the Optimal value for each state
-    for i in range(iterations):
-        v_new = v.copy()
-        for state in MDPenv.states:
-            #value iteration calculation
-            # 1. find probability of action 
-            action_values = {}
-            for action in actions:
-                #get the correct probabilities
-                p_desired = 1 - noise
-                p_other = noise/(len(actions)-1)
-                expected_value = 0
-                for a in actions:
-                    if a == action:
-                        p = p_desired
-                    else: 
-                        p = p_other
-                    # 2. get reward and next state using transition model
-                    next_state, reward = MDPenv.transition(state, action)
-                    # 3. calculate exptected value
-                    expected_value += (p*(reward + gamma*v[(next_state)]))#calculate expected value
-                action_values[action] = expected_value 
-            #retrieve the policy
-            best_action = max(action_values, key=action_values.get)
-            v_new[state] = action_values[best_action]
-
-            policy[state] = best_action
-            #print first 10 iterations
-            if print_data:
-                if (i < 10):
-                    for state in sorted(MDPenv.states):
-                        print(f"iteration {i+1}: ")
-                        print(f"State: {state}, Value: {v[state]:.2f}, Best Action: {policy[state]}")
-        full_policy[i] = policy
-        v=v_new
+    for record in value_iteration_steps(MDPenv, gamma, noise, iterations, epsilon,
+                                        mode=mode):
+        i = record['iteration'] - 1
+        best = record['best']
+        #print first 10 iterations
+        if print_data and i < 10:
+            print(f"iteration {i+1}: residual {record['residual']:.4g}, changed {record['changed']}")
+            for state, value, b in zip(MDPenv.states, v.tolist(), best.tolist()):
+                print(f"State: {state}, Value: {value:.2f}, Best Action: {actions[b]}")
+        if keep_policies:
+            full_policy.append(PolicyArray(MDPenv, best))
+        v = record['v']
+    if not keep_policies and best is not None:
+        # every entry is the final policy, optimal_path reads one per step
+        full_policy = [PolicyArray(MDPenv, best)]*(i+1)
     return full_policy #returns final V, policy, a full policy list
 
-#write a function to follow the optinal policy. Will need to output the policies for all iterations. 
-def optimal_path(start, stop, policy):
+def env_key(MDPenv):
+    """
+    Input: MDPenv
+    Output: hex digest of its grid, walls, obstacles, terminal rewards and action costs
+    """
+    cells, terminals = MDPenv.layout_arrays()
+    h = hashlib.sha256()
+    for part in (np.ascontiguousarray(cells), terminals, np.array(list(MDPenv.actions.values()))):
+        h.update(part.tobytes())
+        h.update(b'|')
+    return h.hexdigest()[:16]
+
+def save_solution(path, MDPenv, v, best, **params):
+    """
+    Input: file path, MDPenv, value array, action columns, solver parameters (gamma, noise, ...)
+    writes the layout, action costs, compiled tables, values and policy as one uncompressed .npz, so
+    np.load reads each array straight from disk only when it is asked for
+    """
+    cells, terminals = MDPenv.layout_arrays()
+    np.savez(path, cells=cells, terminals=terminals, xs=MDPenv.xs, ys=MDPenv.ys, ds=MDPenv.ds,
+             index=MDPenv.index, terminal=MDPenv.terminal, next_state=MDPenv.next_state,
+             reward=MDPenv.reward, actions=np.array(list(MDPenv.actions.items()), dtype=float),
+             v=v, best=np.asarray(best, dtype=np.int8),
+             key=np.array(env_key(MDPenv)),
+             **{f'param_{k}': np.array(val) for k, val in params.items()})
+
+def load_solution(path):
+    """
+    Input: file written by save_solution
+    Output: (MDPenv, value array, action columns, dict of the solver parameters),
+            the environment is rebuilt from the saved tables without compiling
+    """
+    with np.load(path) as data:
+        tables = {name: data[name] for name in ('xs', 'ys', 'ds', 'index', 'terminal',
+                                                 'next_state', 'reward')}
+        actions = {int(a): float(c) for a, c in data['actions']} if 'actions' in data.files else None
+        mdp = MDPenv.from_arrays(data['cells'], data['terminals'], tables, actions)
+        params = {k[len('param_'):]: data[k].item() for k in data.files if k.startswith('param_')}
+        return mdp, data['v'], data['best'].astype(np.int64), params
+
+class SolutionCache:
+    ### directory of save_solution files named <env_key>_<parameter hash>.npz
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, mdp, **params):
+        # numbers are hashed as floats so gamma=1 and gamma=1.0 share a file
+        params = {k: float(v) if isinstance(v, numbers.Real) and not isinstance(v, bool) else v
+                  for k, v in params.items()}
+        digest = hashlib.sha256(repr(sorted(params.items())).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{env_key(mdp)}_{digest}.npz")
+
+    def nearest(self, mdp, gamma, noise):
+        """
+        Input: MDPenv, reward decay, noise
+        Output: value array cached for this environment with the closest gamma and noise,
+                None if nothing is cached for it
+        """
+        best_path, best_dist = None, None
+        prefix = env_key(mdp) + '_'
+        for name in os.listdir(self.directory):
+            if not (name.startswith(prefix) and name.endswith('.npz')):
+                continue
+            path = os.path.join(self.directory, name)
+            with np.load(path) as data:
+                dist = abs(float(data['param_gamma']) - gamma) + abs(float(data['param_noise']) - noise)
+            if best_dist is None or dist < best_dist:
+                best_path, best_dist = path, dist
+        if best_path is None:
+            return None
+        with np.load(best_path) as data:
+            return data['v']
+
+    def solve(self, mdp, gamma, noise, solver='value', epsilon=1e-6, iterations=100000):
+        """
+        Input: MDPenv, reward decay, noise, 'value', 'gauss_seidel', 'prioritized', 'policy'
+               or 'modified', residual to stop at, most iterations
+        Output: (value array, action columns, True when it was loaded from the cache)
+        a miss starts from the nearest cached value function of the same environment
+        """
+        params = dict(gamma=gamma, noise=noise, solver=solver, epsilon=epsilon, iterations=iterations)
+        path = self.path(mdp, **params)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                return data['v'], data['best'].astype(np.int64), True
+        v = self.nearest(mdp, gamma, noise)
+        if solver in ('policy', 'modified'):
+            steps = policy_iteration_steps(mdp, gamma, noise, iterations,
+                                           20 if solver == 'modified' else None,
+                                           epsilon=epsilon, v=v)
+        else:
+            mode = 'sync' if solver == 'value' else solver
+            steps = value_iteration_steps(mdp, gamma, noise, iterations, epsilon, v=v, mode=mode)
+        record = None
+        for record in steps:
+            pass
+        save_solution(path, mdp, record['v'], record['best'], **params)
+        return record['v'], record['best'], False
+
+def assignment_env():
+    """
+    Output: MDPenv for the 5x5 grid used by parts B-F
+    """
     grid_size = 5
     obstacles = {(2,5), (3,2), (4,5)} 
     walls = {(1,4):[(1,3)], \
@@ -146,14 +823,78 @@ def optimal_path(start, stop, policy):
                       (5,2):[(5,3)] \
                       }
     terminal_states = {(5,5): 100, (3,4): -1000}
-    mdp = MDPenv(grid_size, terminal_states, walls, obstacles)
+    return MDPenv(grid_size, terminal_states, walls, obstacles)
+
+def simulate_policy(MDPenv, best, noise, start, agents=10000, max_steps=100, gamma=1.0, seed=0):
+    """
+    Input: MDPenv, action columns (or a PolicyArray), noise, (x, y, d) start state,
+           number of agents, steps before an agent is cut off, reward decay, RNG seed
+    Output: dict with the returns of every agent, mean/std/percentiles of the return,
+            success (ended on a terminal with positive reward), failure (any other
+            terminal) and timeout rates, and path-length stats of the agents that ended
+    every agent moves at once, one gather per step, with the executed action drawn the
+    way noise_matrix mixes them: the chosen one with 1 - noise, else one of the others
+    """
+    best = np.asarray(best.best if isinstance(best, PolicyArray) else best, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    A = MDPenv.next_state.shape[1]
+    s = np.full(agents, MDPenv.state_index(start), dtype=np.int64)
+    if s[0] < 0:
+        raise ValueError(f"{start} is not a state")
+    returns = np.zeros(agents)
+    steps = np.zeros(agents, dtype=np.int64)
+    alive = np.flatnonzero(~MDPenv.terminal[s])
+    discount = 1.0
+    for t in range(max_steps):
+        if len(alive) == 0:
+            break
+        chosen = best[s[alive]]
+        slip = rng.random(len(alive)) < noise
+        executed = np.where(slip, (chosen + rng.integers(1, A, len(alive))) % A, chosen)
+        returns[alive] += discount*MDPenv.reward[s[alive], executed]
+        s[alive] = MDPenv.next_state[s[alive], executed]
+        steps[alive] = t + 1
+        discount *= gamma
+        alive = alive[~MDPenv.terminal[s[alive]]]
+
+    # terminal rewards scattered into the padded grid, read at each agent's final cell
+    pad, n = MDPenv.pad, MDPenv.grid_size
+    cell_reward = np.zeros(MDPenv.cells.shape)
+    for (x, y), r in MDPenv.terminal_states.items():
+        if 1 <= x <= n and 1 <= y <= n:
+            cell_reward[x+pad, y+pad] = r
+    ended = MDPenv.terminal[s]
+    success = ended & (cell_reward[MDPenv.xs[s] + pad, MDPenv.ys[s] + pad] > 0)
+    lengths = steps[ended]
+    return {
+        'agents': agents,
+        'returns': returns,
+        'mean_return': float(returns.mean()),
+        'std_return': float(returns.std()),
+        'return_percentiles': dict(zip((5, 25, 50, 75, 95),
+                                       np.percentile(returns, (5, 25, 50, 75, 95)).tolist())),
+        'success_rate': float(success.mean()),
+        'failure_rate': float((ended & ~success).mean()),
+        'timeout_rate': float((~ended).mean()),
+        'mean_length': float(lengths.mean()) if len(lengths) else None,
+        'length_percentiles': dict(zip((50, 95), np.percentile(lengths, (50, 95)).tolist()))
+                              if len(lengths) else None,
+    }
+
+#write a function to follow the optinal policy. Will need to output the policies for all iterations. 
+def optimal_path(start, stop, policy, mdp=None):
+    # mdp defaults to the environment the policy was solved on, then the assignment grid
+    if mdp is None:
+        mdp = policy[0].mdp if policy and isinstance(policy[0], PolicyArray) else assignment_env()
     curr_state = start
     states = []
     for i in range(10): #limit to 10 steps
         states.append(curr_state)
-        if i < len(policy) and curr_state in policy[i]:
-            next_state, reward = mdp.transition(curr_state, policy[i][curr_state])
-            curr_state = next_state
+        # a run that converged early has fewer policies, its last one is kept
+        step_policy = policy[min(i, len(policy)-1)] if policy else {}
+        if curr_state in step_policy:
+            s = mdp.state_index(curr_state)
+            curr_state = mdp.states[mdp.next_state[s, step_policy[curr_state]-1]]
             # stop when goal is reached
             if curr_state[0:2] == stop[0:2]:
                 states.append(curr_state)
@@ -164,41 +905,54 @@ def main(argv=None, **kwargs):
     ### command line args to pick between parts B-F
     parser = argparse.ArgumentParser(description="MDP Value Iteration")
     parser.add_argument('--part', type=str, choices=['B', 'C', 'D', 'E', 'F'], required=True, help="Part of the assignment to run (B, C, D, E, F)")
+    parser.add_argument('--solver', type=str, choices=['value', 'gauss_seidel', 'prioritized', 'policy', 'modified'], default='value', help="value iteration (synchronous, Gauss-Seidel or prioritized sweeping), policy iteration or modified policy iteration")
+    parser.add_argument('--rollouts', type=int, default=0, help="simulate this many noisy agents following the policy from (1,1,1)")
+    parser.add_argument('--cache', type=str, default=None, help="directory of solved models, earlier runs are loaded and new ones warm-start from them")
     args = parser.parse_args()
+    solve = {'value': value_iteration,
+             'gauss_seidel': partial(value_iteration, mode='gauss_seidel', epsilon=1e-6),
+             'prioritized': partial(value_iteration, mode='prioritized', epsilon=1e-6),
+             'policy': policy_iteration,
+             'modified': modified_policy_iteration}[args.solver]
 
-    #define mdp paraqmeters
-    grid_size = 5
-    obstacles = {(2,5), (3,2), (4,5)} 
-    walls = {(1,4):[(1,3)], \
-                      (1,3): [(1,2), (1,4)], \
-                      (5,4):[(5,3)], \
-                      (5,3): [(5,2), (5,4)],\
-                      (1,2):[(1,3)], \
-                      (5,2):[(5,3)] \
-                      }
-    terminal_states = {(5,5): 100, (3,4): -1000}
-
-    mdp = MDPenv(grid_size, terminal_states, walls, obstacles)
+    mdp = assignment_env()
+    if args.cache is not None:
+        cache = SolutionCache(args.cache)
+        def solve(mdp, gamma, noise, iterations):
+            v, best, hit = cache.solve(mdp, gamma, noise, args.solver, iterations=iterations)
+            print(f"{'loaded' if hit else 'solved'} gamma {gamma}, noise {noise}")
+            actions = list(mdp.actions.keys())
+            for state, value, b in zip(mdp.states, v.tolist(), best.tolist()):
+                print(f"State: {state}, Value: {value:.2f}, Best Action: {actions[b]}")
+            return [PolicyArray(mdp, best)]
 
     #part B
     if args.part == 'B':
-        full_policy = value_iteration(mdp, gamma=1, noise=0, iterations=100)
+        full_policy = solve(mdp, gamma=1, noise=0, iterations=100)
     #part c = follow the policy
     if args.part == 'C':
-        full_policy = value_iteration(mdp, gamma=1, noise=0, iterations=100)
+        full_policy = solve(mdp, gamma=1, noise=0, iterations=100)
         print(optimal_path((1,1,1), (5,5,1), full_policy))
     #part D = gamma = .9
     if args.part == 'D':
-        full_policy = value_iteration(mdp, gamma=.9, noise=0, iterations=100)
+        full_policy = solve(mdp, gamma=.9, noise=0, iterations=100)
         print(optimal_path((1,1,1), (5,5,1), full_policy))
     #part E gamma = .1
     if args.part == 'E':
-        full_policy = value_iteration(mdp, gamma=.1, noise=0, iterations=100)
+        full_policy = solve(mdp, gamma=.1, noise=0, iterations=100)
         print(optimal_path((1,1,1), (5,5,1), full_policy))
     #part F gamma = .9 & noise = .1
     if args.part == 'F':
-        full_policy = value_iteration(mdp, gamma=.9, noise=.1, iterations=100)
+        full_policy = solve(mdp, gamma=.9, noise=.1, iterations=100)
         print(optimal_path((1,1,1), (5,5,1), full_policy))
 
+    if args.rollouts and args.part != 'B':
+        gamma, noise = {'C': (1, 0), 'D': (.9, 0), 'E': (.1, 0), 'F': (.9, .1)}[args.part]
+        stats = simulate_policy(mdp, full_policy[-1], noise, (1,1,1), args.rollouts, gamma=gamma)
+        print(f"rollouts: {stats['agents']}, mean return {stats['mean_return']:.2f} "
+              f"(std {stats['std_return']:.2f}), success {stats['success_rate']:.3f}, "
+              f"failure {stats['failure_rate']:.3f}, timeout {stats['timeout_rate']:.3f}, "
+              f"mean length {'-' if stats['mean_length'] is None else format(stats['mean_length'], '.2f')}")
+
 if __name__ == "__main__":
     main()
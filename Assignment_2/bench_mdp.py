@@ -0,0 +1,157 @@
+### Benchmark for the MDP_HW solvers
+### python bench_mdp.py --out bench.json
+### solves the assignment grid and a seeded set of random grids with value iteration,
+### policy iteration and modified policy iteration and writes one JSON document
+import argparse
+import json
+import platform
+import random
+import time
+
+import numpy as np
+
+from MDP_HW import (MDPenv, assignment_env, batch_value_iteration, policy_iteration_steps,
+                    value_iteration_steps)
+
+def assignment_grid():
+    return assignment_env()
+
+def random_grid(n, rng, obstacle_rate=0.1, wall_rate=0.05, pits=3):
+    """
+    Input: grid size, random source, share of obstacle cells, share of cells with a wall,
+           number of -1000 terminals
+    Output: MDPenv with the +100 terminal at (n, n)
+    """
+    cells = [(x, y) for x in range(1, n+1) for y in range(1, n+1) if (x, y) != (n, n)]
+    rng.shuffle(cells)
+    terminal_states = {(n, n): 100}
+    for cell in cells[:pits]:
+        terminal_states[cell] = -1000
+    obstacles = set(cells[pits:pits + int(obstacle_rate*len(cells))])
+    walls = {}
+    for (x, y) in cells[pits + len(obstacles):]:
+        if rng.random() < wall_rate:
+            dx, dy = rng.choice([(0, 1), (1, 0), (0, -1), (-1, 0)])
+            walls.setdefault((x, y), []).append((x + dx, y + dy))
+    return MDPenv(n, terminal_states, walls, obstacles)
+
+# name -> steps(mdp, gamma, noise, epsilon), every generator yields a record per step
+SOLVERS = {
+    'value': lambda mdp, gamma, noise, eps: value_iteration_steps(mdp, gamma, noise, 100000, eps),
+    'gauss_seidel': lambda mdp, gamma, noise, eps: value_iteration_steps(mdp, gamma, noise, 100000, eps,
+                                                                         mode='gauss_seidel'),
+    'prioritized': lambda mdp, gamma, noise, eps: value_iteration_steps(mdp, gamma, noise, 100000, eps,
+                                                                        mode='prioritized'),
+    'policy': lambda mdp, gamma, noise, eps: policy_iteration_steps(mdp, gamma, noise, 100000,
+                                                                    epsilon=eps),
+    'modified': lambda mdp, gamma, noise, eps: policy_iteration_steps(mdp, gamma, noise, 100000, 20,
+                                                                      epsilon=eps),
+}
+
+def run(solvers, sizes, seeds, settings, epsilon):
+    """
+    Input: solver names, random grid sizes, seeds, (gamma, noise) pairs, residual to stop at
+    Output: JSON-ready dict with one record per (grid, setting, solver)
+    """
+    grids = [('assignment', None, assignment_grid())]
+    for n in sizes:
+        for seed in seeds:
+            grids.append((f'random_{n}', seed, random_grid(n, random.Random(seed*1000 + n))))
+
+    results = []
+    for grid, seed, mdp in grids:
+        for gamma, noise in settings:
+            reference = None
+            for name in solvers:
+                start = time.perf_counter()
+                record = None
+                for record in SOLVERS[name](mdp, gamma, noise, epsilon):
+                    pass
+                elapsed = time.perf_counter() - start
+                if reference is None:
+                    reference = record
+                results.append({
+                    'solver': name, 'grid': grid, 'seed': seed, 'states': len(mdp.states),
+                    'gamma': gamma, 'noise': noise, 'wall_time': elapsed,
+                    'iterations': record['iteration'],
+                    'sweeps': record.get('sweeps', record['iteration']),
+                    # single-state value updates, a sweep is len(states) of them
+                    'backups': record.get('backups', record.get('sweeps', 0)*len(mdp.states)),
+                    'residual': record['residual'],
+                    # against the first solver in the list
+                    'max_value_diff': float(np.abs(record['v'] - reference['v']).max()),
+                    'policy_diff': int((record['best'] != reference['best']).sum()),
+                })
+
+    summary = {}
+    for record in results:
+        s = summary.setdefault(record['solver'], {'runs': 0, 'wall_time': 0.0, 'sweeps': 0, 'backups': 0})
+        s['runs'] += 1
+        s['wall_time'] += record['wall_time']
+        s['sweeps'] += record['sweeps']
+        s['backups'] += record['backups']
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sizes': sizes,
+        'seeds': seeds,
+        'settings': settings,
+        'epsilon': epsilon,
+        'results': results,
+        'summary': summary,
+    }
+
+def run_sweep(num_gammas, num_noises, epsilon):
+    """
+    Input: number of gammas in [0.5, 0.99], number of noises in [0, 0.3], residual to stop at
+    Output: JSON-ready dict timing batch_value_iteration against one run per setting
+            on the assignment grid
+    """
+    mdp = assignment_grid()
+    configs = [(mdp, float(g), float(p)) for g in np.linspace(0.5, 0.99, num_gammas)
+               for p in np.linspace(0.0, 0.3, num_noises)]
+    start = time.perf_counter()
+    batched = batch_value_iteration(configs, 100000, epsilon)
+    batch_time = time.perf_counter() - start
+    start = time.perf_counter()
+    single = [list(value_iteration_steps(m, g, p, 100000, epsilon))[-1] for m, g, p in configs]
+    loop_time = time.perf_counter() - start
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'configs': len(configs),
+        'epsilon': epsilon,
+        'batch_time': batch_time,
+        'loop_time': loop_time,
+        'sweeps': sum(r['iteration'] for r in batched),
+        'max_value_diff': max(float(np.abs(b['v'] - r['v']).max()) for b, r in zip(batched, single)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MDP_HW solvers")
+    parser.add_argument('--solvers', type=str, nargs='+', default=list(SOLVERS), choices=list(SOLVERS),
+                        help="the first one is the reference for value and policy differences")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 20, 40])
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1])
+    parser.add_argument('--gammas', type=float, nargs='+', default=[0.9, 0.99])
+    parser.add_argument('--noises', type=float, nargs='+', default=[0.0, 0.1])
+    parser.add_argument('--epsilon', type=float, default=1e-6, help="residual the solvers stop at")
+    parser.add_argument('--sweep', type=int, nargs=2, default=None, metavar=('GAMMAS', 'NOISES'),
+                        help="time a batched (gamma, noise) sweep on the assignment grid instead")
+    parser.add_argument('--out', type=str, default=None, help="JSON output file (default stdout)")
+    args = parser.parse_args()
+
+    if args.sweep is not None:
+        report = run_sweep(args.sweep[0], args.sweep[1], args.epsilon)
+    else:
+        settings = [[g, p] for g in args.gammas for p in args.noises]
+        report = run(args.solvers, args.sizes, args.seeds, settings, args.epsilon)
+    if args.out is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
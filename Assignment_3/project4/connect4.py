@@ -151,43 +151,48 @@ def evaluate(player, board):
     # w4 for s4
     weights = [0, 1, 4, 16, 1000]
 
-    # Obtain all 4-slot segments on the board
-    seg = []
-    invalid_slot = -1
-    left_revolved = [
-        [invalid_slot]*r + board.row(r) + \
-        [invalid_slot]*(board.rows-1-r) for r in range(board.rows)
-    ]
-    right_revolved = [
-        [invalid_slot]*(board.rows-1-r) + board.row(r) + \
-        [invalid_slot]*r for r in range(board.rows)
-    ]
-    for r in range(board.rows):
-        # row
-        row = board.row(r) 
-        for c in range(board.cols-3):
-            seg.append(row[c:c+4])
-    for c in range(board.cols):
-        # col
-        col = board.col(c) 
-        for r in range(board.rows-3):
-            seg.append(col[r:r+4])
-    for c in zip(*left_revolved):
-        # slash
-        for r in range(board.rows-3):
-            seg.append(c[r:r+4])
-    for c in zip(*right_revolved): 
-        # backslash
-        for r in range(board.rows-3):
-            seg.append(c[r:r+4])
-    # compute score
-    for s in seg:
-        if invalid_slot in s:
-            continue
-        if adversary not in s:
-            score[s.count(player)] += 1
-        if player not in s:
-            adv_score[s.count(adversary)] += 1
+    line_counts = getattr(board, 'line_counts', None)
+    if line_counts is not None:
+        # the bitboard Board counts the segments itself
+        score, adv_score = line_counts(player)
+    else:
+        # Obtain all 4-slot segments on the board
+        seg = []
+        invalid_slot = -1
+        left_revolved = [
+            [invalid_slot]*r + board.row(r) + \
+            [invalid_slot]*(board.rows-1-r) for r in range(board.rows)
+        ]
+        right_revolved = [
+            [invalid_slot]*(board.rows-1-r) + board.row(r) + \
+            [invalid_slot]*r for r in range(board.rows)
+        ]
+        for r in range(board.rows):
+            # row
+            row = board.row(r) 
+            for c in range(board.cols-3):
+                seg.append(row[c:c+4])
+        for c in range(board.cols):
+            # col
+            col = board.col(c) 
+            for r in range(board.rows-3):
+                seg.append(col[r:r+4])
+        for c in zip(*left_revolved):
+            # slash
+            for r in range(board.rows-3):
+                seg.append(c[r:r+4])
+        for c in zip(*right_revolved): 
+            # backslash
+            for r in range(board.rows-3):
+                seg.append(c[r:r+4])
+        # compute score
+        for s in seg:
+            if invalid_slot in s:
+                continue
+            if adversary not in s:
+                score[s.count(player)] += 1
+            if player not in s:
+                adv_score[s.count(adversary)] += 1
     reward = sum([s*w for s, w in zip(score, weights)])
     penalty = sum([s*w for s, w in zip(adv_score, weights)])
     return reward - penalty
@@ -12,21 +12,50 @@ import random, time
 import tkinter as tk
 from .utils import ordinal
 
+try:
+    popcount = int.bit_count
+except AttributeError: # before Python 3.10
+    def popcount(x):
+        return bin(x).count("1")
+
 class Board(object):
+    # Bitboard: one int per player, column c uses bits c*(rows+1) .. c*(rows+1)+rows-1
+    # from the bottom disc up, plus an always-empty guard bit on top so shifts never
+    # carry a line from one column into the next.
 
     EMPTY_SLOT = 0
     PLAYER1 = 1
     PLAYER2 = 2
 
+    _lines = {} # (rows, cols) -> _line_starts()
+
     def __init__(self, rows, cols):
-        self._board = [
-            [self.EMPTY_SLOT]*cols for _ in range(rows)
-        ]
         self.rows = rows
         self.cols = cols
-    
+        self._h = rows + 1
+        self._bits = [0, 0, 0] # indexed by player, slot 0 unused
+        self._heights = [0]*cols
+        self._count = 0
+        self._grid = None # list of rows built on demand for get/row/col/dump
+
+    def _bit(self, row, col):
+        return 1 << (col*self._h + self.rows-1-row)
+
+    def _board(self):
+        if self._grid is None:
+            p1, p2 = self._bits[self.PLAYER1], self._bits[self.PLAYER2]
+            grid = []
+            for r in range(self.rows):
+                line = []
+                for c in range(self.cols):
+                    bit = self._bit(r, c)
+                    line.append(self.PLAYER1 if p1 & bit else self.PLAYER2 if p2 & bit else self.EMPTY_SLOT)
+                grid.append(line)
+            self._grid = grid
+        return self._grid
+
     def __getitem__(self, key):
-        return self._board[key[0]][key[1]]
+        return self._board()[key[0]][key[1]]
     
     def get(self, row, col=None):
         return self.__getitem__(row if col is None else (row, col))
@@ -35,61 +64,109 @@ class Board(object):
         return self.__getitem__(row if col is None else (row, col)) != self.EMPTY_SLOT
     
     def placeable(self, col):
-        return self._board[0][col] == self.EMPTY_SLOT
+        return self._heights[col] < self.rows
 
     def place(self, player, col):
         assert(player == self.PLAYER1 or player == self.PLAYER2)
-        for r in reversed(self._board):
-            if r[col] == self.EMPTY_SLOT:
-                r[col] = player
-                return True
+        h = self._heights[col]
+        if h < self.rows:
+            self._bits[player] |= 1 << (col*self._h + h)
+            self._heights[col] = h + 1
+            self._count += 1
+            self._grid = None
+            return True
         raise ValueError("Column {} is not placeable.".format(col))
 
+    def undo(self, col):
+        # takes back the top disc of the column, the reverse of place
+        h = self._heights[col] - 1
+        if h < 0:
+            raise ValueError("Column {} is empty.".format(col))
+        bit = 1 << (col*self._h + h)
+        self._bits[self.PLAYER1] &= ~bit
+        self._bits[self.PLAYER2] &= ~bit
+        self._heights[col] = h
+        self._count -= 1
+        self._grid = None
+
     def has_draw(self):
-        for r in self._board:
-            for c in r:
-                if c == self.EMPTY_SLOT:
-                    return False
-        return True
+        return self._count == self.rows*self.cols
+
+    def _connects_four(self, m):
+        # vertical, horizontal, and the two diagonals
+        for shift in (1, self._h, self._h - 1, self._h + 1):
+            pairs = m & (m >> shift)
+            if pairs & (pairs >> 2*shift):
+                return True
+        return False
     
+    def _line_starts(self):
+        # (shift, mask of the first slot of every 4-slot line) for each direction
+        key = (self.rows, self.cols)
+        if key not in Board._lines:
+            lines = []
+            for shift, dc, dh in ((1, 0, 1), (self._h, 1, 0), (self._h - 1, 1, -1), (self._h + 1, 1, 1)):
+                starts = 0
+                for c in range(self.cols):
+                    for h in range(self.rows):
+                        if 0 <= c + 3*dc < self.cols and 0 <= h + 3*dh < self.rows:
+                            starts |= 1 << (c*self._h + h)
+                lines.append((shift, starts))
+            Board._lines[key] = lines
+        return Board._lines[key]
+
+    def line_counts(self, player):
+        # ([n0, n1, n2, n3, n4] for the player, the same for the adversary), nk is the
+        # number of 4-slot lines holding k of that side's discs and none of the other's,
+        # added up bit-parallel for every line of a direction at once
+        adversary = self.PLAYER2 if player == self.PLAYER1 else self.PLAYER1
+        sides = (self._bits[player], self._bits[adversary])
+        counts = ([0]*5, [0]*5)
+        for shift, starts in self._line_starts():
+            # a+b+c+d of every line as bit planes: ones + 2*twos + 4*fours
+            planes = []
+            for m in sides:
+                a, b, c, d = m, m >> shift, m >> 2*shift, m >> 3*shift
+                s1, c1, s2, c2 = a ^ b, a & b, c ^ d, c & d
+                ones, carry = s1 ^ s2, s1 & s2
+                planes.append((ones, c1 ^ c2 ^ carry, (c1 & c2) | ((c1 ^ c2) & carry),
+                               a | b | c | d))
+            for (ones, twos, fours, _), (_, _, _, other), n in zip(planes, planes[::-1], counts):
+                free = starts & ~other
+                n[0] += popcount(free & ~(ones | twos | fours))
+                n[1] += popcount(free & ones & ~(twos | fours))
+                n[2] += popcount(free & twos & ~ones)
+                n[3] += popcount(free & ones & twos)
+                n[4] += popcount(free & fours)
+        return counts
+
     def who_wins(self):
-        rows = list(map(lambda r: "".join(map(str, r)), self._board))
-        cols = list(map(lambda c: "".join(map(str, c)), zip(*self._board)))
-        left_revolved = [
-            [self.EMPTY_SLOT]*r+self._board[r]+[self.EMPTY_SLOT]*(self.rows-1-r) for r in range(self.rows)
-        ]
-        left_diag = list(map(lambda d: "".join(map(str, d)), zip(*left_revolved)))
-        right_revolved = [
-            [self.EMPTY_SLOT]*(self.rows-1-r)+self._board[r]+[self.EMPTY_SLOT]*r for r in range(self.rows)
-        ]
-        right_diag = list(map(lambda d: "".join(map(str, d)), zip(*right_revolved)))
-        seg = rows + cols + left_diag + right_diag
-        p1 = "".join(map(str, [self.PLAYER1]*4))
-        for s in seg:
-            if p1 in s:
-                return self.PLAYER1
-        p2 = "".join(map(str, [self.PLAYER2]*4))
-        for s in seg:
-            if p2 in s:
-                return self.PLAYER2
+        if self._connects_four(self._bits[self.PLAYER1]):
+            return self.PLAYER1
+        if self._connects_four(self._bits[self.PLAYER2]):
+            return self.PLAYER2
         return None
 
     def terminal(self):
         return self.has_draw() or self.who_wins() is not None
     
     def clone(self):
-        b = Board(self.rows, self.cols)
-        b._board = [[c for c in r] for r in self._board]
+        b = Board.__new__(Board)
+        b.rows, b.cols, b._h = self.rows, self.cols, self._h
+        b._bits = list(self._bits)
+        b._heights = list(self._heights)
+        b._count = self._count
+        b._grid = self._grid # rows are never changed in place, only rebuilt
         return b
     
     def row(self, r):
-        return [e for e in self._board[r]]
+        return [e for e in self._board()[r]]
     
     def col(self, c):
-        return [self._board[r][c] for r in range(self.rows)]
+        return [r[c] for r in self._board()]
 
     def dump(self, indent=0):
-        return "\n".join([" "*indent + "{}".format(r) for r in self._board])
+        return "\n".join([" "*indent + "{}".format(r) for r in self._board()])
     
     def __str__(self):
         return self.dump()